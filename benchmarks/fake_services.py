@@ -0,0 +1,186 @@
+# Fake Services
+# Local stand-ins for the tikwm API, the TikTok CDN and the Telegram Bot API,
+# all served by one WebServer on localhost, plus the synthetic fixtures they
+# serve. Used by the offline pipeline benchmark.
+#
+# Video ids encode the scenario (see video_id), so the fake tikwm needs no
+# shared state with the benchmark process driving it.
+
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from web_server import WebServer, Request, Response
+
+# Scenario -> id prefix of its synthetic TikToks
+SCENARIO_IDS = {"h264": "71", "hevc": "72", "slideshow": "73"}
+
+# Encoder arguments of the synthetic source videos
+VIDEO_ENCODERS = {
+    "h264": ['-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60'],
+    "hevc": ['-c:v', 'libx265', '-preset', 'ultrafast', '-tag:v', 'hvc1', '-x265-params', 'keyint=60:log-level=error'],
+}
+
+IMAGE_BYTES = 300 * 1024  # Typical slideshow photo
+MUSIC_BYTES = 1024 * 1024  # About a minute of 128 kbps MP3
+
+BOT_API_METHODS = [
+    "getMe", "sendMessage", "editMessageText", "deleteMessage", "sendChatAction",
+    "sendVideo", "sendAudio", "sendPhoto", "sendMediaGroup",
+]
+
+
+def video_id(scenario: str, run: int, index: int) -> str:
+    """Unique TikTok id of job index, so no cache layer can answer it from an earlier job"""
+    return f"{SCENARIO_IDS[scenario]}{run:06d}{index:08d}"
+
+
+def video_url(scenario: str, run: int, index: int) -> str:
+    return f"https://www.tiktok.com/@bench/video/{video_id(scenario, run, index)}"
+
+
+def make_fixtures(directory: Path, duration: int, images: int) -> Dict[str, Path]:
+    """
+    Write the files served by the fake CDN into directory.
+    Videos are real (testsrc2 + tone, faststart MP4) and need ffmpeg; encoders ffmpeg lacks
+    are skipped. Photos and the music track are random bytes: the pipeline only moves them.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    fixtures: Dict[str, Path] = {}
+    if shutil.which("ffmpeg"):
+        for codec, encoder in VIDEO_ENCODERS.items():
+            path = directory / f"{codec}.mp4"
+            try:
+                subprocess.run([
+                    'ffmpeg', '-y', '-loglevel', 'error',
+                    '-f', 'lavfi', '-i', f'testsrc2=size=720x1280:rate=30:duration={duration}',
+                    '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+                    *encoder, '-c:a', 'aac', '-shortest', '-movflags', '+faststart', str(path)
+                ], check=True)
+                fixtures[codec] = path
+            except subprocess.CalledProcessError:
+                print(f"ffmpeg no puede generar la muestra {codec}, se omite")
+    else:
+        print("ffmpeg no está instalado: solo se generan las muestras de slideshow")
+
+    for i in range(images):
+        path = directory / f"img_{i + 1}.jpg"
+        path.write_bytes(os.urandom(IMAGE_BYTES))
+        fixtures[path.stem] = path
+    music = directory / "music.mp3"
+    music.write_bytes(os.urandom(MUSIC_BYTES))
+    fixtures["music"] = music
+    return fixtures
+
+
+class FakeServices:
+    """
+    tikwm (POST /api/), CDN (GET /cdn/<file>) and Bot API (POST /bot<token>/<method>)
+    with optional fixed latencies.
+    """
+
+    def __init__(self, port: int, fixtures_dir: Path, token: str, duration: int,
+                 api_latency: float = 0.0, cdn_latency: float = 0.0, bot_latency: float = 0.0):
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.fixtures = {p.name: p.read_bytes() for p in fixtures_dir.iterdir() if p.is_file()}
+        self.duration = duration
+        self.api_latency = api_latency
+        self.cdn_latency = cdn_latency
+        self.bot_latency = bot_latency
+        self._ids = itertools.count(1)
+
+        # Uploads can be as large as Telegram's limit
+        self.server = WebServer("127.0.0.1", port, max_body=64 * 1024 * 1024)
+        self.server.route("POST", "/api/", self.tikwm)
+        for name in self.fixtures:
+            self.server.route("GET", f"/cdn/{name}", self.cdn)
+        for method in BOT_API_METHODS:
+            self.server.route("POST", f"/bot{token}/{method}", self.bot_api)
+
+    def cdn_url(self, name: str) -> str:
+        return f"{self.base_url}/cdn/{name}"
+
+    def video_info(self, vid: str) -> Optional[dict]:
+        """tikwm 'data' object of a synthetic TikTok"""
+        scenario = next((s for s, prefix in SCENARIO_IDS.items() if vid.startswith(prefix)), None)
+        info = {
+            "id": vid,
+            "title": f"Benchmark {scenario} {vid}",
+            "author": {"unique_id": "bench"},
+            "duration": self.duration,
+            "music": self.cdn_url("music.mp3"),
+            "music_info": {"id": "bench-music"},
+        }
+        if scenario == "slideshow":
+            info["images"] = [self.cdn_url(n) for n in sorted(self.fixtures) if n.startswith("img_")]
+            return info
+        name = f"{scenario}.mp4"
+        if name not in self.fixtures:
+            return None
+        size = len(self.fixtures[name])
+        info.update(play=self.cdn_url(name), hdplay=self.cdn_url(name), size=size, hd_size=size)
+        return info
+
+    async def tikwm(self, request: Request) -> Response:
+        await asyncio.sleep(self.api_latency)
+        url = parse_qs(request.body.decode()).get("url", [""])[0]
+        match = re.search(r'/video/(\d+)', url)
+        info = self.video_info(match.group(1)) if match else None
+        if info is None:
+            body = {"code": -1, "msg": "Url parsing is failed! Please check url."}
+        else:
+            body = {"code": 0, "msg": "success", "data": info}
+        return Response(body=json.dumps(body).encode(), content_type="application/json")
+
+    async def cdn(self, request: Request) -> Response:
+        await asyncio.sleep(self.cdn_latency)
+        name = request.path.rsplit("/", 1)[-1]
+        return Response(body=self.fixtures[name], content_type="application/octet-stream")
+
+    def _file(self, **fields) -> dict:
+        n = next(self._ids)
+        return {"file_id": f"bench-file-{n}", "file_unique_id": f"bench-{n}", **fields}
+
+    def _message(self, **fields) -> dict:
+        return {"message_id": next(self._ids), "date": int(time.time()), "chat": {"id": 1, "type": "private"}, **fields}
+
+    async def bot_api(self, request: Request) -> Response:
+        await asyncio.sleep(self.bot_latency)
+        method = request.path.rsplit("/", 1)[-1]
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method in ("deleteMessage", "sendChatAction"):
+            result = True
+        elif method == "sendVideo":
+            result = self._message(video=self._file(width=720, height=1280, duration=self.duration))
+        elif method == "sendAudio":
+            result = self._message(audio=self._file(duration=self.duration))
+        elif method == "sendPhoto":
+            result = self._message(photo=[self._file(width=1080, height=1920)])
+        elif method == "sendMediaGroup":
+            photos = len(re.findall(rb'"type":\s*"photo"', request.body))
+            result = [self._message(photo=[self._file(width=1080, height=1920)]) for _ in range(photos)]
+        else:
+            result = self._message(text="ok")
+        return Response(body=json.dumps({"ok": True, "result": result}).encode(), content_type="application/json")
+
+
+def serve(port: int, fixtures_dir: str, token: str, duration: int,
+          api_latency: float, cdn_latency: float, bot_latency: float) -> None:
+    """Process entry point: run the fake services until terminated"""
+    async def run():
+        services = FakeServices(port, Path(fixtures_dir), token, duration, api_latency, cdn_latency, bot_latency)
+        await services.server.start()
+        await asyncio.Event().wait()
+    asyncio.run(run())
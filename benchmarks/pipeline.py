@@ -0,0 +1,272 @@
+# Pipeline Benchmark
+# Runs whole jobs (tikwm lookup, CDN download, transcode, Telegram upload)
+# offline against the local stand-ins of fake_services.py and reports
+# throughput, p50/p95/p99 latency, CPU seconds per job and peak RSS.
+#
+# Usage:
+#   python benchmarks/pipeline.py [--scenarios h264,hevc,slideshow] [--jobs 20] [--concurrency 4]
+#                                 [--duration 15] [--images 12] [--save results.json]
+#                                 [--baseline results.json] [--tolerance 0.2]
+# With --baseline the exit status is 1 when a scenario failed jobs or regressed by more than
+# the tolerance (p95 latency or CPU per job up, throughput down).
+#
+# Jobs call download_video_async / download_slideshow_async and send_content, the same
+# coroutines the bot runs (the blocking download_* wrappers can't run inside the event loop).
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Project modules (and fake_services, which uses the web server) read config at import time,
+# so they are imported once main() has pointed the environment at the fakes
+
+SCENARIOS = ["h264", "hevc", "slideshow"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.2):
+            return
+        time.sleep(0.05)
+    raise RuntimeError(f"Los servicios falsos no respondieron en el puerto {port}")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)] if ordered else 0.0
+
+
+def cpu_seconds() -> float:
+    """CPU time of this process plus its finished children (the ffmpeg processes)"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+async def run_scenario(scenario: str, run: int, args, bot) -> dict:
+    """Run args.jobs jobs of one scenario, args.concurrency at a time"""
+    from telegram import Message, Update
+    from bot import send_content
+    from sysinfo import PeakRss
+    from tiktok_downloader import download_video_async, download_slideshow_async
+    from workspace import create_workspace, remove_workspace
+    from fake_services import video_url
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def job(index: int, measured: bool) -> None:
+        nonlocal failures
+        url = video_url(scenario, run, index)
+        message = Message.de_json(
+            {"message_id": index, "date": int(time.time()), "chat": {"id": 1, "type": "private"}, "text": url}, bot
+        )
+        update = Update(update_id=index, message=message)
+        async with semaphore:
+            job_dir = create_workspace()
+            start = time.perf_counter()
+            try:
+                status_message = await message.reply_text("⏳ Iniciando Descarga...")
+                if scenario == "slideshow":
+                    result = await download_slideshow_async(url, None, job_dir)
+                else:
+                    result = await download_video_async(url, None, job_dir)
+                ok = result.success and await send_content(update, result, status_message) is not None
+            except Exception as e:
+                print(f"Job {url} falló: {e}", file=sys.__stderr__)
+                ok = False
+            finally:
+                remove_workspace(job_dir)
+        if measured:
+            latencies.append(time.perf_counter() - start)
+            failures += not ok
+
+    # Warm-up jobs open the pooled connections and fill the shared-sound cache
+    await asyncio.gather(*(job(args.jobs + i, False) for i in range(args.warmup)))
+
+    peak_rss = PeakRss()
+    sampling = True
+
+    async def sample_rss():
+        while sampling:
+            peak_rss.sample()
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample_rss())
+    cpu_start = cpu_seconds()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(job(i, True) for i in range(args.jobs)))
+    wall = time.perf_counter() - wall_start
+    cpu = cpu_seconds() - cpu_start
+    sampling = False
+    await sampler
+
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024  # KB on Linux
+    return {
+        "jobs": args.jobs,
+        "concurrency": args.concurrency,
+        "failures": failures,
+        "wall": round(wall, 3),
+        "throughput": round(args.jobs / wall, 3),
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "cpu_per_job": round(cpu / args.jobs, 3),
+        "peak_rss_mb": round((peak_rss.peak or 0) / 1048576, 1),
+        "ffmpeg_max_rss_mb": round(children_rss, 1),  # Largest child so far, not per scenario
+    }
+
+
+async def run_benchmark(args, scenarios: List[str]) -> Dict[str, dict]:
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+    from config import BOT_TOKEN, BOT_API_BASE_URL, BOT_API_FILE_URL
+    from http_session import close_client
+
+    # Same pool size the Application builder gives the bot
+    bot = Bot(BOT_TOKEN, base_url=BOT_API_BASE_URL, base_file_url=BOT_API_FILE_URL,
+              request=HTTPXRequest(connection_pool_size=256))
+    await bot.initialize()
+    if not args.verbose:
+        # One log line per HTTP request would bury the report
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        logging.getLogger("bot").setLevel(logging.WARNING)
+    results = {}
+    try:
+        for run, scenario in enumerate(scenarios, start=1):
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                results[scenario] = await run_scenario(scenario, run, args, bot)
+            print_result(scenario, results[scenario])
+    finally:
+        await bot.shutdown()
+        await close_client()
+    return results
+
+
+def print_result(scenario: str, result: dict) -> None:
+    print(
+        f"{scenario:10} {result['jobs']} jobs x{result['concurrency']}: "
+        f"{result['throughput']:.2f} jobs/s, p50 {result['p50']:.2f}s p95 {result['p95']:.2f}s p99 {result['p99']:.2f}s, "
+        f"CPU {result['cpu_per_job']:.2f}s/job, RSS pico {result['peak_rss_mb']} MB, fallos {result['failures']}"
+    )
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Regressions of results against baseline, as readable lines"""
+    regressions = []
+    for scenario, result in results.items():
+        if result["failures"]:
+            regressions.append(f"{scenario}: {result['failures']} jobs fallidos")
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        if base.get("concurrency") != result["concurrency"]:
+            print(f"{scenario}: la línea base usó concurrencia {base.get('concurrency')}, no se compara")
+            continue
+        for metric in ("p95", "cpu_per_job"):
+            if base[metric] and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{scenario}: {metric} {base[metric]} -> {result[metric]}")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {base['throughput']} -> {result['throughput']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the download + send pipeline")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma separated: h264, hevc, slideshow")
+    parser.add_argument("--jobs", type=int, default=20, help="Measured jobs per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured jobs run first")
+    parser.add_argument("--duration", type=int, default=15, help="Seconds of the synthetic videos")
+    parser.add_argument("--images", type=int, default=12, help="Photos per slideshow")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Seconds the fake tikwm waits")
+    parser.add_argument("--cdn-latency", type=float, default=0.0, help="Seconds the fake CDN waits")
+    parser.add_argument("--bot-latency", type=float, default=0.0, help="Seconds the fake Bot API waits")
+    parser.add_argument("--save", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="pipebench_"))
+    server = None
+    try:
+        # Point the bot at the fakes and at throwaway cache/download directories before importing it
+        port = free_port()
+        os.environ.update({
+            "TIKWM_API_URL": f"http://127.0.0.1:{port}/api/",
+            "TIKWM_RATE": "1000000",
+            "TIKWM_BURST": "1000000",
+            "BOT_API_BASE_URL": f"http://127.0.0.1:{port}/bot",
+            "BOT_API_FILE_URL": f"http://127.0.0.1:{port}/file/bot",
+            "CACHE_DIR": str(work_dir / "cache"),
+            "DOWNLOAD_DIR": str(work_dir / "downloads"),
+        })
+        from config import BOT_TOKEN
+        from fake_services import make_fixtures, serve
+
+        fixtures = make_fixtures(work_dir / "fixtures", args.duration, args.images)
+        scenarios = []
+        for scenario in args.scenarios.split(","):
+            if scenario == "slideshow" or scenario in fixtures:
+                scenarios.append(scenario)
+            else:
+                print(f"Escenario {scenario} omitido: no hay muestra")
+
+        # Separate process, so the fakes' CPU and memory stay out of the measurements
+        server = multiprocessing.Process(
+            target=serve,
+            args=(port, str(work_dir / "fixtures"), BOT_TOKEN, args.duration,
+                  args.api_latency, args.cdn_latency, args.bot_latency),
+            daemon=True,
+        )
+        server.start()
+        wait_for_port(port)
+
+        results = asyncio.run(run_benchmark(args, scenarios))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Resultados guardados en {args.save}")
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"REGRESIÓN {line}")
+        if regressions:
+            sys.exit(1)
+        print("Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Segment Transcode Benchmark
+# Compares the wall time of one ffmpeg/libx264 process against the
+# segment-parallel encode on the same input.
+#
+# Usage:
+#   python benchmarks/segment_transcode.py [input.mp4] [--duration 180] [--workers N] [--runs 3] [--preset medium]
+# Without an input a synthetic MPEG-4 clip (so it needs a full H.264 encode) is generated.
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import ENCODER_PRESETS
+from media_probe import probe_media
+from tiktok_downloader import build_ffmpeg_command, run_ffmpeg, transcode_segmented
+
+
+def make_sample(path: Path, duration: int) -> None:
+    """Synthetic 720x1280 clip with a tone, encoded as MPEG-4 Part 2"""
+    subprocess.run([
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size=720x1280:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'mpeg4', '-q:v', '3', '-g', '60', '-c:a', 'aac', '-shortest', str(path)
+    ], check=True)
+
+
+def time_single(source: Path, output: Path, preset: str) -> float:
+    media = probe_media(source)
+    start = time.perf_counter()
+    run_ffmpeg(build_ffmpeg_command(str(source), media, output, preset=preset), media)
+    return time.perf_counter() - start
+
+
+def time_segmented(source: Path, output: Path, workers: int, preset: str) -> float:
+    media = probe_media(source)
+    start = time.perf_counter()
+    transcode_segmented(source, media, output, None, None, workers, preset)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Single-process vs segment-parallel transcode")
+    parser.add_argument("input", nargs="?", help="Video to encode (default: generated sample)")
+    parser.add_argument("--duration", type=int, default=180, help="Seconds of the generated sample")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--preset", default=ENCODER_PRESETS[0], help="libx264 preset of both encodes")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="segbench_"))
+    try:
+        source = work_dir / "source.mp4"
+        if args.input:
+            shutil.copyfile(args.input, source)
+        else:
+            print(f"Generando muestra de {args.duration}s...")
+            make_sample(source, args.duration)
+
+        media = probe_media(source)
+        print(f"Entrada: {media.codec} {media.width}x{media.height}, {media.duration:.1f}s, workers={args.workers}")
+
+        single, segmented = [], []
+        for run in range(args.runs):
+            single.append(time_single(source, work_dir / f"single_{run}.mp4", args.preset))
+            segmented.append(time_segmented(source, work_dir / f"segmented_{run}.mp4", args.workers, args.preset))
+            print(f"  run {run + 1}: single {single[-1]:.2f}s, segmented {segmented[-1]:.2f}s")
+
+        single_median = statistics.median(single)
+        segmented_median = statistics.median(segmented)
+        print(f"Mediana single:    {single_median:.2f}s")
+        print(f"Mediana segmented: {segmented_median:.2f}s")
+        print(f"Speedup:           {single_median / segmented_median:.2f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
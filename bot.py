@@ -3,11 +3,17 @@
 
 import re
 import os
+import hmac
+import json
+import signal
 import asyncio
+import threading
 import time
 import logging
+from contextlib import ExitStack
 from pathlib import Path
-from telegram import Update, InputMediaPhoto, InputMediaVideo
+from typing import List, Optional, Tuple
+from telegram import Update, InputFile, InputMediaPhoto, InputMediaVideo
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -16,9 +22,38 @@ from telegram.ext import (
     ContextTypes,
 )
 from telegram.constants import ParseMode, ChatAction
+from telegram.error import BadRequest
 
-from config import BOT_TOKEN, TIKTOK_PATTERNS, DOWNLOAD_DIR
-from tiktok_downloader import download_video, download_audio, clean_downloads, DownloadResult
+from config import (
+    BOT_TOKEN, TIKTOK_PATTERNS, DOWNLOAD_DIR, TELEGRAM_MAX_UPLOAD, SLIDESHOW_UPLOAD_CONCURRENCY,
+    BOT_MODE, BOT_API_BASE_URL, BOT_API_FILE_URL,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS,
+    WEB_HOST, WEB_PORT,
+)
+from tiktok_downloader import (
+    download_video_async,
+    download_audio_async,
+    clean_downloads,
+    resolve_video_id,
+    get_tiktok_info_async,
+    DownloadResult,
+)
+import http_session
+from http_session import close_client
+from workspace import create_workspace, remove_workspace, run_janitor
+from file_id_cache import file_id_cache
+from single_flight import SingleFlight
+from transcode_scheduler import transcode_scheduler
+from preflight import TooLargeError, size_target_stats
+from sysinfo import sample_peak_rss
+from metrics import metrics
+from tracing import span, job_trace
+from media_cache import result_cache, audio_cache
+from metadata_cache import metadata_cache
+from metadata_providers import metadata_chain
+from rate_limit import tikwm_bucket
+from encoder_policy import encoder_policy
+from web_server import WebServer, Request, Response, add_health_routes
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +62,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Coalesces concurrent requests for the same TikTok into one download/transcode/upload
+video_flights = SingleFlight()
+
+# Telegram accepts at most 10 items per media group
+MEDIA_GROUP_LIMIT = 10
+
 
 def is_tiktok_url(text: str) -> bool:
     """Check if the text contains a TikTok URL"""
@@ -45,6 +86,192 @@ def extract_tiktok_url(text: str) -> str:
     return ""
 
 
+async def resolve_video(url: str) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Find the TikTok id for url without downloading anything.
+    Long links carry the id and known short links are memoized;
+    other short links need one API lookup, whose info is returned for reuse.
+    """
+    video_id = resolve_video_id(url)
+    if video_id:
+        return video_id, None
+    
+    info = await get_tiktok_info_async(url)
+    if info and info.get("id"):
+        return str(info["id"]), info
+    return None, info
+
+
+def message_file_id(message) -> Optional[str]:
+    """Return the file_id of the video/audio/photo carried by a sent message"""
+    if message is None:
+        return None
+    if message.photo:
+        return message.photo[-1].file_id
+    media = message.video or message.audio or message.animation or message.document
+    return media.file_id if media else None
+
+
+def count_uploaded(path) -> None:
+    """Add a file sent from disk to the uploaded bytes counter"""
+    metrics.inc("uploaded_bytes_total", os.path.getsize(path))
+
+
+def music_key(music_id: str) -> str:
+    """file_id cache key of a TikTok sound, shared by every video that uses it"""
+    return f"music:{music_id}"
+
+
+async def reply_audio(update: Update, audio_path: str, music_id: str, title: str, caption: str):
+    """
+    Send an audio file, reusing the Telegram file_id of the same sound when it was uploaded before.
+    Returns the sent message.
+    """
+    cached = file_id_cache.get(music_key(music_id), "audio") if music_id else None
+    if cached:
+        try:
+            return await update.message.reply_audio(audio=cached["audio"], title=title, caption=caption)
+        except BadRequest as e:
+            logger.warning(f"Stale audio file_id for music {music_id}: {e}")
+            file_id_cache.invalidate(music_key(music_id))
+    
+    with open(audio_path, 'rb') as audio_file:
+        sent = await update.message.reply_audio(audio=audio_file, title=title, caption=caption)
+    count_uploaded(audio_path)
+    if music_id:
+        file_id_cache.put(music_key(music_id), audio=message_file_id(sent))
+    return sent
+
+
+def media_groups(items: list) -> List[list]:
+    """
+    Split items into consecutive chunks that fit in one media group.
+    Albums need at least 2 items, so a lone trailing item borrows one from the previous chunk.
+    """
+    groups = [items[i:i + MEDIA_GROUP_LIMIT] for i in range(0, len(items), MEDIA_GROUP_LIMIT)]
+    if len(groups) > 1 and len(groups[-1]) == 1:
+        groups[-1].insert(0, groups[-2].pop())
+    return groups
+
+
+def group_caption(title: str, index: int, total: int) -> str:
+    """Caption of the first photo of album index (numbered when the slideshow needs several albums)"""
+    return f"🖼️ {title}" + (f" ({index + 1}/{total})" if total > 1 else "")
+
+
+def stream_upload(path: str, stack: ExitStack, attach: bool = False) -> InputFile:
+    """
+    Upload input whose file handle is read by the HTTP client while sending,
+    so the file is never loaded into memory as a whole. The handle is closed with stack.
+    """
+    handle = stack.enter_context(open(path, 'rb'))
+    count_uploaded(path)
+    return InputFile(handle, filename=Path(path).name, attach=attach, read_file_handle=False)
+
+
+async def send_slideshow(update: Update, image_files: List[str], title: str, video_id: str) -> List[Optional[str]]:
+    """
+    Send every image of a slideshow as consecutive albums of up to 10 photos.
+    A group's files are only opened right before it is sent and streamed from disk, so at most
+    SLIDESHOW_UPLOAD_CONCURRENCY groups are in flight and no album is buffered in RAM.
+    Returns the photo file_ids in slideshow order.
+    """
+    groups = media_groups(image_files)
+    semaphore = asyncio.Semaphore(SLIDESHOW_UPLOAD_CONCURRENCY)
+    
+    async def send_group(index: int, paths: List[str]) -> List[Optional[str]]:
+        async with semaphore:
+            with ExitStack() as stack:
+                if len(paths) == 1:
+                    # A single photo can't be sent as an album
+                    sent = await update.message.reply_photo(
+                        photo=stream_upload(paths[0], stack),
+                        caption=group_caption(title, index, len(groups))
+                    )
+                    return [message_file_id(sent)]
+                media_group = [
+                    InputMediaPhoto(
+                        media=stream_upload(path, stack, attach=True),
+                        caption=group_caption(title, index, len(groups)) if i == 0 else None
+                    )
+                    for i, path in enumerate(paths)
+                ]
+                sent_messages = await update.message.reply_media_group(media=media_group)
+        return [message_file_id(m) for m in sent_messages]
+    
+    # Sampled while the uploads are in flight, which is when their buffers would show
+    async with sample_peak_rss() as peak_rss:
+        with span("upload_slideshow"):
+            results = await asyncio.gather(*(send_group(i, paths) for i, paths in enumerate(groups)))
+    logger.info(f"Slideshow {video_id}: {len(image_files)} imágenes en {len(groups)} álbumes, {peak_rss}")
+    return [file_id for group in results for file_id in group]
+
+
+async def send_cached(update: Update, entry: dict, status_message, audio_only: bool = False, url: Optional[str] = None, video_id: Optional[str] = None, job_dir: Optional[Path] = None) -> None:
+    """
+    Re-send previously uploaded content using the cached Telegram file_ids.
+    When url and job_dir are given and Telegram rejects only the audio file_id, the audio alone is
+    downloaded and sent again, so the media already delivered isn't sent a second time.
+    """
+    title = entry.get("title", "")
+    
+    if audio_only:
+        await update.message.reply_audio(
+            audio=entry["audio"],
+            title=entry.get("audio_title") or title,
+            caption=f"🎵 {entry.get('audio_title') or title}"
+        )
+        await status_message.delete()
+        return
+    
+    media = entry.get("media", [])
+    if entry.get("content_type") == 'slideshow':
+        groups = media_groups(media)
+        for index, file_ids in enumerate(groups):
+            if len(file_ids) == 1:
+                await update.message.reply_photo(photo=file_ids[0], caption=group_caption(title, index, len(groups)))
+                continue
+            media_group = [
+                InputMediaPhoto(media=file_id, caption=group_caption(title, index, len(groups)) if i == 0 else None)
+                for i, file_id in enumerate(file_ids)
+            ]
+            await update.message.reply_media_group(media=media_group)
+        audio_caption = "🎵 Audio del slideshow"
+    else:
+        await update.message.reply_video(
+            video=media[0],
+            caption=f"📹 {title}",
+            supports_streaming=True
+        )
+        audio_caption = "🎵 Audio del video"
+    
+    if entry.get("audio"):
+        try:
+            await update.message.reply_audio(
+                audio=entry["audio"],
+                title=f"Audio - {title}",
+                caption=audio_caption
+            )
+        except BadRequest as e:
+            if url is None or job_dir is None:
+                raise
+            logger.warning(f"Stale audio file_id for {video_id or url}: {e}")
+            await resend_audio(update, url, video_id, job_dir, f"Audio - {title}", audio_caption)
+    
+    await status_message.delete()
+
+
+async def resend_audio(update: Update, url: str, video_id: Optional[str], job_dir: Path, title: str, caption: str) -> None:
+    """Download and send only the audio of url, replacing a rejected audio file_id in the cache"""
+    result = await download_audio_async(url, None, job_dir)
+    if not (result.success and result.files):
+        logger.warning(f"Could not re-fetch the audio of {video_id or url}: {result.error}")
+        return
+    sent = await reply_audio(update, result.files[0], result.music_id, title, caption)
+    if video_id:
+        file_id_cache.put(video_id, audio=message_file_id(sent))
+
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /start command"""
     welcome_message = """
@@ -102,6 +329,63 @@ async def audio_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         )
 
 
+class ProgressReporter:
+    """
+    Progress callback that edits a job's status message at most once every interval seconds
+    (Telegram's flood limit). A message that arrives too soon isn't dropped: the latest one is
+    sent when the interval ends, so the last state shown (e.g. a queue position) is never stale.
+    Callable from worker threads; close() it before the job edits the status message itself.
+    """
+
+    def __init__(self, status_message, loop: asyncio.AbstractEventLoop, interval: float = 2.5):
+        self.status_message = status_message
+        self.loop = loop
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last_sent = 0.0
+        self._pending: Optional[str] = None
+        self._flush_scheduled = False
+        self._closed = False
+
+    def __call__(self, msg: str) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            wait = self._last_sent + self.interval - time.time()
+            if wait > 0 or self._flush_scheduled:
+                self._pending = msg
+                if not self._flush_scheduled:
+                    self._flush_scheduled = True
+                    self.loop.call_soon_threadsafe(self.loop.call_later, wait, self._flush)
+                return
+            self._last_sent = time.time()
+        self._send(msg)
+
+    def _flush(self) -> None:
+        with self._lock:
+            msg, self._pending = self._pending, None
+            self._flush_scheduled = False
+            if msg is None or self._closed:
+                return
+            self._last_sent = time.time()
+        self._send(msg)
+
+    def _send(self, msg: str) -> None:
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self.status_message.edit_text(f"*(Procesando)*\n{msg}", parse_mode=ParseMode.MARKDOWN),
+                self.loop
+            )
+        except Exception as e:
+            logger.error(f"Error in progress callback: {e}")
+
+    def close(self) -> None:
+        """Stop editing the status message (pending updates are discarded)"""
+        with self._lock:
+            self._closed = True
+            self._pending = None
+
+
 async def process_audio_request(update: Update, url: str) -> None:
     """Process audio extraction request"""
     status_message = await update.message.reply_text(
@@ -112,55 +396,58 @@ async def process_audio_request(update: Update, url: str) -> None:
     # Show typing action
     await update.message.chat.send_action(ChatAction.UPLOAD_VOICE)
     
-    # Variables for throttling progress updates
-    last_update_time = [0]
-    main_loop = asyncio.get_running_loop()
+    # Throttled status updates (Telegram flood limits)
+    progress_callback = ProgressReporter(status_message, asyncio.get_running_loop())
     
-    def progress_callback(msg: str):
-        now = time.time()
-        # Update UI maximum once every 2.5 seconds to prevent Telegram flood limits
-        if now - last_update_time[0] > 2.5:
-            last_update_time[0] = now
-            # Schedule the coroutine in the main event loop
-            try:
-                asyncio.run_coroutine_threadsafe(
-                    status_message.edit_text(f"*(Procesando)*\n{msg}", parse_mode=ParseMode.MARKDOWN),
-                    main_loop
-                )
-            except Exception as e:
-                logger.error(f"Error in audio progress callback: {e}")
-                
-    try:
-        # Download audio in thread pool
-        result = await main_loop.run_in_executor(None, lambda: download_audio(url, progress_callback))
+    # Every request gets its own workspace so parallel jobs never touch each other's files
+    job_dir = create_workspace()
+    
+    with job_trace("audio", url=url) as trace:
+        try:
+            # Answer from the file_id cache when this audio was already uploaded
+            with span("resolve"):
+                video_id, info = await resolve_video(url)
+            trace.attrs["video_id"] = video_id
+            cached = file_id_cache.get(video_id, "audio") if video_id else None
+            if cached:
+                logger.info(f"file_id cache hit (audio) for {video_id}: {file_id_cache.stats()}")
+                try:
+                    await send_cached(update, cached, status_message, audio_only=True)
+                    trace.attrs["outcome"] = "file_id_cache"
+                    return
+                except BadRequest as e:
+                    # Telegram no longer accepts the stored file_id, download again
+                    logger.warning(f"Stale file_id for {video_id}: {e}")
+                    file_id_cache.invalidate(video_id)
         
-        if result.success and result.files:
-            audio_path = Path(result.files[0])
-            
-            # Send audio
-            with open(audio_path, 'rb') as audio_file:
-                await update.message.reply_audio(
-                    audio=audio_file,
-                    title=result.title,
-                    caption=f"🎵 {result.title}"
-                )
+            # Network I/O runs on the event loop, ffmpeg (if any) in worker threads
+            result = await download_audio_async(url, progress_callback, job_dir, info)
+            progress_callback.close()
+            trace.attrs.update(outcome="sent" if result.success and result.files else "failed", connections=result.connections)
+        
+            if result.success and result.files:
+                # Send audio
+                sent = await reply_audio(update, result.files[0], result.music_id, result.title, f"🎵 {result.title}")
             
-            await status_message.delete()
+                if result.video_id:
+                    file_id_cache.put(result.video_id, audio=message_file_id(sent), audio_title=result.title)
             
-            # Clean up
-            clean_downloads()
-        else:
+                await status_message.delete()
+            else:
+                await status_message.edit_text(
+                    f"❌ *Error al extraer audio:*\n{result.error}",
+                    parse_mode=ParseMode.MARKDOWN
+                )
+        except Exception as e:
+            logger.error(f"Error processing audio: {e}")
+            trace.attrs["outcome"] = "error"
             await status_message.edit_text(
-                f"❌ *Error al extraer audio:*\n{result.error}",
+                f"❌ *Error:* {str(e)}",
                 parse_mode=ParseMode.MARKDOWN
             )
-    except Exception as e:
-        logger.error(f"Error processing audio: {e}")
-        await status_message.edit_text(
-            f"❌ *Error:* {str(e)}",
-            parse_mode=ParseMode.MARKDOWN
-        )
-        clean_downloads()
+        finally:
+            progress_callback.close()
+            remove_workspace(job_dir)
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -198,48 +485,93 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # Show typing action
     await update.message.chat.send_action(ChatAction.UPLOAD_VIDEO)
     
-    # Variable to throttle updates
-    last_update_time = [0]
-    main_loop = asyncio.get_running_loop()
+    # Throttled status updates (Telegram flood limits); queue positions are flushed, never dropped
+    progress_callback = ProgressReporter(status_message, asyncio.get_running_loop())
     
-    def progress_callback(msg: str):
-        now = time.time()
-        # Telegram API flood constraint: 1 edit every ~2.5 secs
-        if now - last_update_time[0] > 2.5:
-            last_update_time[0] = now
-            try:
-                asyncio.run_coroutine_threadsafe(
-                    status_message.edit_text(f"*(Procesando)*\n{msg}", parse_mode=ParseMode.MARKDOWN),
-                    main_loop
+    # Every request gets its own workspace so parallel jobs never touch each other's files
+    job_dir = create_workspace()
+    
+    with job_trace("video", url=url) as trace:
+        try:
+            # Answer from the file_id cache when this TikTok was already uploaded
+            with span("resolve"):
+                video_id, info = await resolve_video(url)
+            trace.attrs["video_id"] = video_id
+            cached = file_id_cache.get(video_id, "media") if video_id else None
+            if cached:
+                logger.info(f"file_id cache hit for {video_id}: {file_id_cache.stats()}")
+                try:
+                    await send_cached(update, cached, status_message, url=url, video_id=video_id, job_dir=job_dir)
+                    trace.attrs["outcome"] = "file_id_cache"
+                    return
+                except BadRequest as e:
+                    # Telegram no longer accepts the stored file_id, download again
+                    logger.warning(f"Stale file_id for {video_id}: {e}")
+                    file_id_cache.invalidate(video_id)
+        
+            async def deliver() -> Optional[dict]:
+                """Download, send and return the uploaded file_ids (None on failure)"""
+                # Network I/O runs on the event loop, ffmpeg in worker threads
+                result = await download_video_async(url, progress_callback, job_dir, info)
+                progress_callback.close()
+                trace.attrs.update(content_type=result.content_type, connections=result.connections)
+            
+                if result.success:
+                    await status_message.edit_text("✅ *Alistando archivo para envío, espera...*", parse_mode=ParseMode.MARKDOWN)
+                    entry = await send_content(update, result, status_message)
+                    trace.attrs["outcome"] = "sent"
+                    return entry
+                trace.attrs["outcome"] = "failed"
+            
+                await status_message.edit_text(
+                    f"❌ *Error al descargar:*\n{result.error}",
+                    parse_mode=ParseMode.MARKDOWN
                 )
-            except Exception as e:
-                logger.error(f"Error in video progress callback: {e}")
-                
-    try:
-        # Download video in thread pool to avoid blocking
-        result = await main_loop.run_in_executor(None, lambda: download_video(url, progress_callback))
+                return None
         
-        if result.success:
-            await status_message.edit_text("✅ *Alistando archivo para envío, espera...*", parse_mode=ParseMode.MARKDOWN)
-            await send_content(update, result, status_message)
-        else:
+            if not video_id:
+                await deliver()
+                return
+        
+            # Identical links sent at the same time wait for the first job and reuse its uploads
+            if video_flights.in_flight(video_id):
+                await status_message.edit_text(
+                    "⏳ *Este video ya se está procesando, espera un momento...*",
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            entry, shared = await video_flights.run(video_id, deliver)
+            if shared:
+                trace.attrs["outcome"] = "shared"
+                if entry:
+                    await send_cached(update, entry, status_message, url=url, video_id=video_id, job_dir=job_dir)
+                else:
+                    await status_message.edit_text(
+                        "❌ *Error al descargar:*\nNo se pudo procesar este video. Intenta de nuevo.",
+                        parse_mode=ParseMode.MARKDOWN
+                    )
+            
+        except Exception as e:
+            logger.error(f"Error processing URL: {e}")
+            metrics.error("job")
+            trace.attrs["outcome"] = "error"
             await status_message.edit_text(
-                f"❌ *Error al descargar:*\n{result.error}",
+                f"❌ *Error:* {str(e)}",
                 parse_mode=ParseMode.MARKDOWN
             )
-            
-    except Exception as e:
-        logger.error(f"Error processing URL: {e}")
-        await status_message.edit_text(
-            f"❌ *Error:* {str(e)}",
-            parse_mode=ParseMode.MARKDOWN
-        )
-    finally:
-        clean_downloads()
+        finally:
+            progress_callback.close()
+            remove_workspace(job_dir)
 
 
-async def send_content(update: Update, result: DownloadResult, status_message) -> None:
-    """Send downloaded content to user"""
+async def send_content(update: Update, result: DownloadResult, status_message) -> Optional[dict]:
+    """
+    Send downloaded content to user and remember the resulting file_ids.
+    Returns the file_id cache entry, or None if nothing reusable was sent.
+    """
+    # file_ids returned by Telegram, stored in the cache once everything was sent
+    sent_media = []
+    sent_audio = None
+    
     try:
         if result.content_type == 'video':
             # Send video
@@ -247,32 +579,55 @@ async def send_content(update: Update, result: DownloadResult, status_message) -
             
             # Check file size (Telegram limit is 50MB for bots)
             file_size = video_path.stat().st_size
-            if file_size > 50 * 1024 * 1024:  # 50 MB
-                await status_message.edit_text(
-                    "❌ El video es demasiado grande (>50MB).\n"
-                    "Telegram tiene un límite de 50MB para bots."
-                )
-                return
+            if file_size > TELEGRAM_MAX_UPLOAD:
+                await status_message.edit_text(f"❌ {TooLargeError(file_size)}")
+                return None
             
             await update.message.chat.send_action(ChatAction.UPLOAD_VIDEO)
             
-            with open(video_path, 'rb') as video_file:
-                await update.message.reply_video(
-                    video=video_file,
-                    caption=f"📹 {result.title}",
-                    supports_streaming=True
-                )
+            # Dimensions and duration come from the probe done during transcoding
+            media_kwargs = {}
+            if result.media and result.media.width and result.media.height:
+                media_kwargs = {
+                    "width": result.media.width,
+                    "height": result.media.height,
+                    "duration": int(result.media.duration) or None,
+                }
             
-            # Send audio if available (videos now include audio by default)
+            async def upload_video():
+                start = time.perf_counter()
+                with span("upload_video"), open(video_path, 'rb') as video_file:
+                    sent = await update.message.reply_video(
+                        video=video_file,
+                        caption=f"📹 {result.title}",
+                        supports_streaming=True,
+                        **media_kwargs
+                    )
+                count_uploaded(video_path)
+                result.timings["upload_video"] = round(time.perf_counter() - start, 3)
+                return sent
+            
+            async def upload_audio(audio_path: str):
+                start = time.perf_counter()
+                with span("upload_audio"):
+                    sent = await reply_audio(update, audio_path, result.music_id, f"Audio - {result.title}", "🎵 Audio del video")
+                result.timings["upload_audio"] = round(time.perf_counter() - start, 3)
+                return sent
+            
+            # Video and audio (videos include audio by default) are uploaded at the same time
             audio_files = [f for f in result.files if Path(f).suffix.lower() in ['.mp3', '.m4a', '.opus']]
+            uploads = [upload_video()]
             if audio_files:
-                await update.message.chat.send_action(ChatAction.UPLOAD_VOICE)
-                with open(audio_files[0], 'rb') as audio_file:
-                    await update.message.reply_audio(
-                        audio=audio_file,
-                        title=f"Audio - {result.title}",
-                        caption="🎵 Audio del video"
-                    )
+                uploads.append(upload_audio(audio_files[0]))
+            
+            upload_start = time.perf_counter()
+            sent_messages = await asyncio.gather(*uploads)
+            result.timings["upload_wall"] = round(time.perf_counter() - upload_start, 3)
+            logger.info(f"Stage timings for {result.video_id}: {result.timings}")
+            
+            sent_media.append(message_file_id(sent_messages[0]))
+            if audio_files:
+                sent_audio = message_file_id(sent_messages[1])
             
             await status_message.delete()
             
@@ -283,41 +638,25 @@ async def send_content(update: Update, result: DownloadResult, status_message) -
             video_files = [f for f in result.files if Path(f).suffix.lower() in ['.mp4', '.webm']]
             
             if image_files:
-                # Send images as album (max 10 per group)
+                # Send images as albums (max 10 per group), streamed from disk
                 await update.message.chat.send_action(ChatAction.UPLOAD_PHOTO)
-                
-                media_group = []
-                for i, img_path in enumerate(image_files[:10]):
-                    with open(img_path, 'rb') as img_file:
-                        if i == 0:
-                            media_group.append(InputMediaPhoto(
-                                media=img_file.read(),
-                                caption=f"🖼️ {result.title}"
-                            ))
-                        else:
-                            media_group.append(InputMediaPhoto(media=img_file.read()))
-                
-                if media_group:
-                    await update.message.reply_media_group(media=media_group)
+                sent_media.extend(await send_slideshow(update, image_files, result.title, result.video_id))
             
             elif video_files:
                 # If slideshow converted to video
-                with open(video_files[0], 'rb') as video_file:
+                with span("upload_video"), open(video_files[0], 'rb') as video_file:
                     await update.message.reply_video(
                         video=video_file,
                         caption=f"📹 {result.title}",
                         supports_streaming=True
                     )
+                count_uploaded(video_files[0])
             
             # Send audio if available
             if audio_files:
                 await update.message.chat.send_action(ChatAction.UPLOAD_VOICE)
-                with open(audio_files[0], 'rb') as audio_file:
-                    await update.message.reply_audio(
-                        audio=audio_file,
-                        title=f"Audio - {result.title}",
-                        caption="🎵 Audio del slideshow"
-                    )
+                sent = await reply_audio(update, audio_files[0], result.music_id, f"Audio - {result.title}", "🎵 Audio del slideshow")
+                sent_audio = message_file_id(sent)
             
             await status_message.delete()
             
@@ -327,21 +666,36 @@ async def send_content(update: Update, result: DownloadResult, status_message) -
             
             await update.message.chat.send_action(ChatAction.UPLOAD_VOICE)
             
-            with open(audio_path, 'rb') as audio_file:
+            with span("upload_audio"), open(audio_path, 'rb') as audio_file:
                 await update.message.reply_audio(
                     audio=audio_file,
                     title=result.title,
                     caption=f"🎵 {result.title}"
                 )
+            count_uploaded(audio_path)
             
             await status_message.delete()
+        
+        # Remember the uploaded file_ids so the next request for this TikTok skips the download
+        if result.video_id and sent_media and all(sent_media) and result.content_type != 'audio':
+            entry = {
+                "content_type": result.content_type,
+                "title": result.title,
+                "media": sent_media,
+                "audio": sent_audio,
+            }
+            file_id_cache.put(result.video_id, **entry)
+            return entry
+        return None
             
     except Exception as e:
         logger.error(f"Error sending content: {e}")
+        metrics.error("send")
         await status_message.edit_text(
             f"❌ *Error al enviar:* {str(e)}",
             parse_mode=ParseMode.MARKDOWN
         )
+        return None
 
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -353,10 +707,112 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         )
 
 
-def main() -> None:
-    """Start the bot"""
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+# Serves the health page (and the webhook in webhook mode) on the bot's event loop
+web_server: Optional[WebServer] = None
+janitor_task: Optional[asyncio.Task] = None
+
+
+async def post_init(application: Application) -> None:
+    """Start the web server and the workspace janitor once the application's event loop is running"""
+    global janitor_task
+    janitor_task = asyncio.create_task(run_janitor())
+    if web_server is not None:
+        await web_server.start()
+
+
+async def post_shutdown(application: Application) -> None:
+    """Stop the web server and the janitor, close the downloader's pooled HTTP connections and save the file_id cache"""
+    if janitor_task is not None:
+        janitor_task.cancel()
+    if web_server is not None:
+        await web_server.stop()
+    await close_client()
+    await asyncio.to_thread(file_id_cache.flush)
+
+
+def webhook_handler(application: Application):
+    """Route handler that feeds Telegram's webhook deliveries into the application's update queue"""
+    async def handle(request: Request) -> Response:
+        # Constant-time comparison, so response timing doesn't leak the shared secret (bytes: headers may be non-ASCII)
+        token = (request.headers.get("x-telegram-bot-api-secret-token") or "").encode("latin-1")
+        if not hmac.compare_digest(token, WEBHOOK_SECRET.encode()):
+            return Response(status=403, body=b"Forbidden")
+        try:
+            update = Update.de_json(json.loads(request.body), application.bot)
+        except ValueError:
+            return Response(status=400, body=b"Bad Request")
+        # Answer right away; handlers run concurrently from the queue
+        await application.update_queue.put(update)
+        return Response(body=b"ok")
+    return handle
+
+
+async def run_webhook(application: Application) -> None:
+    """
+    Webhook mode: Telegram pushes updates to WEBHOOK_URL + WEBHOOK_PATH, served by the same
+    web server (and event loop) as the health routes. Runs until SIGINT/SIGTERM.
+    """
+    await application.initialize()
+    await post_init(application)
+    try:
+        await application.start()
+        await application.bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+        logger.info(f"Webhook registrado en {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+        
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass  # Windows: rely on KeyboardInterrupt
+        await stop.wait()
+    finally:
+        # Also reached when set_webhook fails: shutdown() refuses a running application
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        await post_shutdown(application)
+
+
+def register_metrics_sources() -> None:
+    """Export the counters every component already keeps on /metrics"""
+    metrics.register("transcode_scheduler", transcode_scheduler.stats)
+    metrics.register("encoder_policy", encoder_policy.stats, {"choices": "preset"})
+    metrics.register("size_target", size_target_stats.stats)
+    metrics.register("file_id_cache", file_id_cache.stats)
+    metrics.register("result_cache", result_cache.stats)
+    metrics.register("audio_cache", audio_cache.stats)
+    metrics.register("metadata_cache", metadata_cache.stats)
+    metrics.register("metadata_chain", metadata_chain.stats, {"wins": "provider", "providers": "provider"})
+    metrics.register("tikwm_bucket", tikwm_bucket.stats)
+    metrics.register("video_flights", video_flights.stats)
+    metrics.register("http", http_session.stats, {"by_host": "host"})
+    if web_server is not None:
+        metrics.register("web_server", web_server.stats)
+
+
+def build_application(webhook: bool) -> Application:
+    """Create the application and register the handlers"""
+    # Concurrent updates so several users can download at once
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(BOT_API_BASE_URL)
+        .base_file_url(BOT_API_FILE_URL)
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if webhook:
+        # Updates arrive through the web server, no polling updater
+        builder = builder.updater(None)
+    application = builder.build()
     
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
@@ -364,16 +820,41 @@ def main() -> None:
     
     # Add error handler
     application.add_error_handler(error_handler)
+    return application
+
+
+def main(with_web_server: bool = False) -> None:
+    """
+    Start the bot.
+    with_web_server also serves the health page (always on in webhook mode).
+    """
+    global web_server
+    webhook = BOT_MODE == "webhook"
+    if webhook and not WEBHOOK_URL:
+        logger.error("BOT_MODE=webhook necesita WEBHOOK_URL (URL pública https del bot)")
+        return
     
-    # Create downloads directory
+    application = build_application(webhook)
+    if with_web_server or webhook:
+        web_server = WebServer(WEB_HOST, WEB_PORT)
+        add_health_routes(web_server)
+        if webhook:
+            web_server.route("POST", WEBHOOK_PATH, webhook_handler(application))
+    register_metrics_sources()
+    
+    # Create downloads directory and drop leftovers from a previous run (no jobs are running yet)
     DOWNLOAD_DIR.mkdir(exist_ok=True)
+    clean_downloads()
     
     # Start bot
-    logger.info("Starting RS TikTok Downloader Bot...")
+    logger.info(f"Starting RS TikTok Downloader Bot ({BOT_MODE})...")
     logger.info(f"Bot token: {BOT_TOKEN[:10]}...")
     
-    # Run bot with polling
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if webhook:
+        asyncio.run(run_webhook(application))
+    else:
+        # Run bot with polling
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
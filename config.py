@@ -1,6 +1,7 @@
 # TikTok Telegram Bot Configuration
 
 import os
+import hashlib
 from pathlib import Path
 
 # Bot Configuration
@@ -8,12 +9,129 @@ BOT_TOKEN = "8218958423:AAEQaY7q1eN7Xb1umG5G98cE7fFfqPummtI"
 BOT_USERNAME = "@tiktokrs_bot"
 DEBUG_MODE = False
 
+# Update delivery: "polling", or "webhook" (Telegram pushes updates to WEBHOOK_URL + WEBHOOK_PATH)
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")  # Public https base URL of this server
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", hashlib.sha256(BOT_TOKEN.encode()).hexdigest()[:32])
+WEBHOOK_MAX_CONNECTIONS = 40  # Parallel webhook deliveries Telegram may open
+
+# Bot API endpoints (point them at a local fake Bot API for tests and benchmarks)
+BOT_API_BASE_URL = os.environ.get("BOT_API_BASE_URL", "https://api.telegram.org/bot")
+BOT_API_FILE_URL = os.environ.get("BOT_API_FILE_URL", "https://api.telegram.org/file/bot")
+
+# Web server (health page and webhook, on the bot's event loop)
+WEB_HOST = "0.0.0.0"
+WEB_PORT = int(os.environ.get("PORT", 7860))
+WEB_KEEPALIVE_TIMEOUT = 75  # Seconds an idle connection is kept open
+WEB_REQUEST_TIMEOUT = 30  # Seconds a client gets to send the rest of a request once it started it
+WEB_MAX_BODY = 1024 * 1024  # Largest request body accepted (updates are a few KB)
+
 # Paths
 BASE_DIR = Path(__file__).parent
-DOWNLOAD_DIR = BASE_DIR / "downloads"
+DOWNLOAD_DIR = Path(os.environ.get("DOWNLOAD_DIR", BASE_DIR / "downloads"))
+CACHE_DIR = Path(os.environ.get("CACHE_DIR", BASE_DIR / "cache"))
 
-# Create download directory if it doesn't exist
+# Create download and cache directories if they don't exist
 DOWNLOAD_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
+
+# Per-job workspaces (seconds)
+WORKSPACE_MAX_AGE = 60 * 60  # Job directories older than this are considered orphaned
+WORKSPACE_JANITOR_INTERVAL = 10 * 60  # How often the janitor looks for orphaned directories
+
+# Telegram file_id cache (re-send popular videos without downloading them again)
+FILE_ID_CACHE_PATH = CACHE_DIR / "file_ids.json"
+FILE_ID_CACHE_TTL = 7 * 24 * 60 * 60  # Seconds an entry stays valid
+FILE_ID_CACHE_MAX_ENTRIES = 5000
+FILE_ID_CACHE_SAVE_DELAY = 5  # Seconds changes are batched before the cache file is rewritten
+
+# Shared HTTP sessions (tikwm API and CDN downloads)
+HTTP_MAX_CONNECTIONS = 100  # Total connections in the shared pool
+HTTP_POOL_MAXSIZE = 20  # Concurrent requests allowed per host
+HTTP_KEEPALIVE_EXPIRY = 30  # Seconds an idle keep-alive connection is kept open
+HTTP_RETRIES = 3  # Retries for connection errors and 5xx/429 responses
+HTTP_BACKOFF = 0.5  # Backoff factor between retries (0.5s, 1s, 2s...)
+
+# Transcode scheduler
+TRANSCODE_WORKERS = os.cpu_count() or 1  # Max ffmpeg/BMF transcodes running at once
+TRANSCODE_MAX_QUEUE = 20  # Jobs allowed to wait for a slot before new ones are rejected
+
+# Slideshows
+SLIDESHOW_CONCURRENCY = 6  # Images (and the audio track) fetched in parallel per job
+SLIDESHOW_UPLOAD_CONCURRENCY = 1  # Albums of 10 uploaded at once; above 1 they may arrive out of order
+
+# Streaming transcode: pipe CDN bytes straight into ffmpeg instead of writing the file first
+STREAM_TRANSCODE = True
+STREAM_PROBE_BYTES = 1024 * 1024  # Bytes buffered to detect the codec before starting ffmpeg
+
+# On-disk cache of final (transcoded + normalized) videos
+RESULT_CACHE_DIR = CACHE_DIR / "results"
+RESULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB budget, least recently used entries go first
+
+# On-disk cache of TikTok sounds, keyed by music id
+AUDIO_CACHE_DIR = CACHE_DIR / "audio"
+AUDIO_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# In-memory cache of tikwm API responses (seconds)
+METADATA_CACHE_TTL = 5 * 60  # Upper bound, entries expire earlier if their signed CDN URLs do
+METADATA_CACHE_MAX_ENTRIES = 2000
+CDN_EXPIRY_MARGIN = 60  # Drop entries this long before their CDN URLs stop working
+SHORT_LINK_TTL = 7 * 24 * 60 * 60  # Short link -> video id memo
+SHORT_LINK_MAX_ENTRIES = 20000
+
+# tikwm API governor
+TIKWM_RATE = float(os.environ.get("TIKWM_RATE", 1.0))  # Requests per second for the whole bot (free tier allows 1 request/second)
+TIKWM_BURST = int(os.environ.get("TIKWM_BURST", 2))  # Requests allowed back to back after an idle period
+TIKWM_THROTTLE_RETRIES = 3  # Retries, with backoff, of a tikwm call that failed, was throttled or got a 5xx (the only retries of tikwm calls)
+TIKWM_BREAKER_THRESHOLD = 5  # Consecutive failures that open the circuit
+TIKWM_BREAKER_COOLDOWN = 30  # Seconds the circuit stays open before a trial request
+
+# Metadata providers, asked in order: ("tikwm", api_url) or ("local", fixtures_json_path)
+# A provider slower than its p95 latency is hedged with the next one
+METADATA_PROVIDERS = [
+    ("tikwm", os.environ.get("TIKWM_API_URL", "https://www.tikwm.com/api/")),
+]
+METADATA_TIMEOUT = 30  # Seconds before a provider request gives up
+METADATA_HEDGE_DEFAULT_DELAY = 2.0  # Hedge delay until a provider has enough latency samples
+METADATA_HEDGE_MIN_SAMPLES = 20
+METADATA_LATENCY_WINDOW = 200  # Recent answers used to compute the p95
+
+# Preflight: pick the quality tier that fits Telegram's upload limit before downloading
+TELEGRAM_MAX_UPLOAD = 50 * 1024 * 1024  # Bots can't send files larger than 50 MB
+PREFLIGHT_SIZE_MARGIN = 0.95  # Keep outputs a little under the limit (container overhead, AAC audio)
+PREFLIGHT_AUDIO_BITRATE = 128_000  # AAC bitrate reserved when computing a target video bitrate
+PREFLIGHT_MIN_VIDEO_BITRATE = 250_000  # Below this a re-encode is not worth watching; reject instead
+SIZE_FALLBACK_STEP = 0.9  # Extra reduction applied on top of the overshoot when an encode misses the limit
+
+# Audio loudness normalization (EBU R128)
+LOUDNESS_TARGET_I = -16  # Integrated loudness target (LUFS)
+LOUDNESS_TARGET_LRA = 11  # Loudness range target (LU)
+LOUDNESS_TARGET_TP = -1.5  # True peak ceiling (dBTP)
+LOUDNESS_TOLERANCE = 1.0  # Tracks within this many LU of the target are copied, not re-encoded
+LOUDNESS_CACHE_SIZE = 2000  # Measurements kept in memory, by video id
+
+# Segment-parallel transcoding of long videos
+SEGMENT_MIN_DURATION = 120  # Seconds; shorter videos are encoded by a single ffmpeg process
+SEGMENT_SECONDS = 15  # Approximate segment length (cuts land on the next keyframe)
+SEGMENT_MAX_WORKERS = os.cpu_count() or 1  # ffmpeg processes per segmented encode
+
+# Adaptive libx264 preset: quality when idle, speed under load
+ENCODER_PRESETS = ["medium", "fast", "veryfast", "superfast"]  # Idle, normal, queue building, saturated
+ENCODER_QUEUE_HIGH = 5  # Jobs waiting for a slot that count as saturated
+ENCODER_LOAD_HIGH = 1.5  # Load average per core that counts as saturated
+ENCODER_LOAD_IDLE = 0.5  # Below this (and with at most one encode running) the host is idle
+
+# Metrics exported on /metrics (Prometheus text format)
+METRICS_PREFIX = "tiktokbot"
+METRICS_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]  # Stage latency buckets (seconds)
+
+# Per-job tracing: one JSON timeline per job in the logs, cProfile dumps of a sample of slow jobs
+TRACE_ENABLED = True
+TRACE_SLOW_JOB_SECONDS = 30  # Profiled jobs slower than this keep their profile
+TRACE_PROFILE_SAMPLE_RATE = float(os.environ.get("TRACE_PROFILE_SAMPLE_RATE", 0.0))  # Share of jobs run under cProfile
+TRACE_PROFILE_DIR = CACHE_DIR / "profiles"
+TRACE_PROFILE_KEEP = 20  # Newest profile dumps kept on disk
 
 # TikTok URL patterns
 TIKTOK_PATTERNS = [
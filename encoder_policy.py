@@ -0,0 +1,62 @@
+# Encoder Policy Module
+# Picks the libx264 preset for each encode from the transcode queue and CPU
+# load: faster presets during spikes, better ones when the host is idle.
+
+import threading
+from typing import Dict, Optional
+
+from config import ENCODER_PRESETS, ENCODER_QUEUE_HIGH, ENCODER_LOAD_HIGH, ENCODER_LOAD_IDLE
+from sysinfo import cpu_load
+from transcode_scheduler import transcode_scheduler
+
+
+class EncoderPolicy:
+    """
+    Maps pressure to a preset from ENCODER_PRESETS (best quality first):
+    idle -> presets[0], normal -> presets[1], queue building -> presets[2], saturated -> presets[3].
+    Every decision is counted so the quality/latency trade-off can be monitored.
+    """
+
+    def __init__(self, presets=ENCODER_PRESETS):
+        self.presets = list(presets)
+        self._lock = threading.Lock()
+        self.choices: Dict[str, int] = {p: 0 for p in self.presets}
+        self.last_preset: Optional[str] = None
+        self.last_queue_depth = 0
+        self.last_load: Optional[float] = None
+
+    def level(self, queue_depth: int, active: int, load: Optional[float]) -> int:
+        """Pressure level 0 (idle) .. 3 (saturated)"""
+        load = load if load is not None else 0.0
+        if queue_depth >= ENCODER_QUEUE_HIGH or load >= ENCODER_LOAD_HIGH:
+            return 3
+        if queue_depth > 0:
+            return 2
+        if active <= 1 and load < ENCODER_LOAD_IDLE:
+            return 0
+        return 1
+
+    def choose(self) -> str:
+        """Preset for an encode starting now"""
+        queue_depth = transcode_scheduler.queue_depth()
+        load = cpu_load()
+        level = self.level(queue_depth, transcode_scheduler.active(), load)
+        preset = self.presets[min(level, len(self.presets) - 1)]
+        with self._lock:
+            self.choices[preset] = self.choices.get(preset, 0) + 1
+            self.last_preset = preset
+            self.last_queue_depth = queue_depth
+            self.last_load = load
+        return preset
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "choices": dict(self.choices),
+                "last_preset": self.last_preset,
+                "last_queue_depth": self.last_queue_depth,
+                "last_load": round(self.last_load, 3) if self.last_load is not None else None,
+            }
+
+
+encoder_policy = EncoderPolicy()
@@ -0,0 +1,137 @@
+# Telegram file_id Cache
+# Remembers the file_id values Telegram returns after an upload so that the
+# same TikTok can be re-sent instantly without downloading or transcoding it.
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from config import FILE_ID_CACHE_PATH, FILE_ID_CACHE_TTL, FILE_ID_CACHE_MAX_ENTRIES, FILE_ID_CACHE_SAVE_DELAY
+
+
+class FileIdCache:
+    """
+    Persistent LRU cache of Telegram file_ids keyed by TikTok video id.
+
+    Each entry is a dict such as:
+        {"content_type": "video", "title": "...", "media": [file_id], "audio": file_id}
+    where "media" holds the video file_id or the list of photo file_ids of a slideshow.
+
+    Changes are written to disk by a timer thread save_delay seconds after the first unsaved
+    one, so uploads on the event loop never wait for a rewrite of the whole file; call flush()
+    on shutdown to write what is still pending.
+    """
+
+    def __init__(self, path: Path, ttl: float, max_entries: int, save_delay: float = FILE_ID_CACHE_SAVE_DELAY):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # One writer of the file at a time
+        self._save_timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self._load()
+
+    def get(self, key: str, field: Optional[str] = None) -> Optional[dict]:
+        """
+        Return the entry for key, or None if missing or expired.
+        If field is given the entry only counts as a hit when it contains that field.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.get("ts", 0) > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None or (field and not entry.get(field)):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry)
+
+    def put(self, key: str, **fields) -> None:
+        """Merge fields into the entry for key and schedule a save"""
+        with self._lock:
+            entry = self._entries.pop(key, {})
+            entry.update({k: v for k, v in fields.items() if v})
+            entry["ts"] = time.time()
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._schedule_save()
+
+    def invalidate(self, key: str) -> None:
+        """Drop an entry, e.g. when Telegram rejects a stale file_id"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._schedule_save()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for logging and monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _load(self) -> None:
+        """Load entries from disk, dropping the expired ones"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        now = time.time()
+        valid = [(k, v) for k, v in data.items() if now - v.get("ts", 0) <= self.ttl]
+        valid.sort(key=lambda item: item[1].get("ts", 0))
+        for key, entry in valid[-self.max_entries:]:
+            self._entries[key] = entry
+
+    def flush(self) -> None:
+        """Write pending changes now (run by the save timer, and on shutdown)"""
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                data = json.dumps(self._entries, ensure_ascii=False)
+            self._save(data)
+
+    def _schedule_save(self) -> None:
+        """Mark the cache dirty and start the save timer if it isn't running. Must hold the lock."""
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save(self, data: str) -> None:
+        """Write the cache atomically so a crash never leaves a truncated file"""
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error guardando cache de file_id: {e}")
+
+
+file_id_cache = FileIdCache(FILE_ID_CACHE_PATH, FILE_ID_CACHE_TTL, FILE_ID_CACHE_MAX_ENTRIES)
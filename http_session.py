@@ -0,0 +1,189 @@
+# Shared HTTP Session Module
+# One pooled, keep-alive httpx.AsyncClient for every HTTP call of the downloader,
+# plus counters of how many TCP/TLS handshakes were actually made.
+
+import asyncio
+import random
+import threading
+import weakref
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+
+from config import HTTP_MAX_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_KEEPALIVE_EXPIRY, HTTP_RETRIES, HTTP_BACKOFF
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ConnectionCounter:
+    """Thread-safe count of new connections (each one is a TCP, and for HTTPS a TLS, handshake)"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self) -> None:
+        with self._lock:
+            self.count += 1
+
+
+_total_connections = ConnectionCounter()
+_connections_by_host = defaultdict(int)
+_job_counter: ContextVar[Optional[ConnectionCounter]] = ContextVar("http_job_counter", default=None)
+
+
+def _record_connection(host: str) -> None:
+    """Account one handshake globally, per host and for the current job"""
+    _total_connections.add()
+    with _total_connections._lock:
+        _connections_by_host[host] += 1
+    job_counter = _job_counter.get()
+    if job_counter is not None:
+        job_counter.add()
+
+
+def _connection_tracer(host: str):
+    """httpcore trace hook that records every new TCP connection"""
+    async def trace(event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            _record_connection(host)
+    return trace
+
+
+class _LoopState:
+    """Client and per-host limits bound to one event loop"""
+
+    def __init__(self):
+        self.client = self._make_client(HTTP_RETRIES)
+        # For callers that pace their own retries: the transport doesn't retry connect errors either
+        self.single_attempt_client = self._make_client(0)
+        self.host_limits: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(HTTP_POOL_MAXSIZE))
+
+
+    @staticmethod
+    def _make_client(transport_retries: int) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=transport_retries),  # Connect errors only
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+        )
+
+
+_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+
+def _get_state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None:
+        state = _LoopState()
+        _states[loop] = state
+    return state
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared client of the running event loop.
+    All jobs on the loop share its keep-alive connections.
+    """
+    return _get_state().client
+
+
+async def close_client() -> None:
+    """Close the running loop's client (bot shutdown, end of a sync call)"""
+    state = _states.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.client.aclose()
+        await state.single_attempt_client.aclose()
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter: ~0.5s, 1s, 2s... for HTTP_BACKOFF=0.5"""
+    return HTTP_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+@asynccontextmanager
+async def stream(method: str, url: str, retry: bool = True, **kwargs) -> AsyncIterator[httpx.Response]:
+    """
+    Open a streaming request through the shared pool.
+    429/5xx responses and transport errors are retried with backoff before the body is read.
+    Callers that pace their own retries (the
+    rate-limited tikwm API) pass retry=False: exactly one request is sent, transport errors
+    are raised and every response comes back as is.
+    Concurrent requests per host are capped at HTTP_POOL_MAXSIZE.
+    """
+    state = _get_state()
+    client = state.client if retry else state.single_attempt_client
+    retries = HTTP_RETRIES if retry else 0
+    host = httpx.URL(url).host
+    extensions = {"trace": _connection_tracer(host)}
+
+    async with state.host_limits[host]:
+        for attempt in range(retries + 1):
+            last_attempt = attempt == retries
+            try:
+                request = client.build_request(method, url, extensions=extensions, **kwargs)
+                response = await client.send(request, stream=True)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            
+            if response.status_code in RETRY_STATUSES and not last_attempt:
+                await response.aclose()
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            
+            # Errors while the caller reads the body are not retried here
+            try:
+                yield response
+            finally:
+                await response.aclose()
+            return
+
+
+async def request(method: str, url: str, retry: bool = True, **kwargs) -> httpx.Response:
+    """Non-streaming request (body fully read) with the same pooling and retries as stream()"""
+    async with stream(method, url, retry=retry, **kwargs) as response:
+        await response.aread()
+        return response
+
+
+def run_sync(coro):
+    """Run a coroutine from synchronous code on a private loop, closing its client afterwards"""
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_client()
+    return asyncio.run(runner())
+
+
+@contextmanager
+def track_connections() -> Iterator[ConnectionCounter]:
+    """Count the handshakes made by the current job (its task and the tasks it spawns)"""
+    counter = ConnectionCounter()
+    token = _job_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _job_counter.reset(token)
+
+
+def stats() -> dict:
+    """Handshake counters since startup, for benchmarking"""
+    with _total_connections._lock:
+        return {
+            "connections_opened": _total_connections.count,
+            "by_host": dict(_connections_by_host),
+        }
@@ -0,0 +1,121 @@
+# Loudness Module
+# Measures a track's loudness once (EBU R128 via ffmpeg's loudnorm analysis),
+# caches it by video id and decides whether the audio needs normalizing at all.
+
+import json
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from config import DEBUG_MODE, LOUDNESS_TARGET_I, LOUDNESS_TARGET_LRA, LOUDNESS_TARGET_TP, LOUDNESS_TOLERANCE, LOUDNESS_CACHE_SIZE
+from metrics import metrics
+
+LOUDNORM_TARGET = f"loudnorm=I={LOUDNESS_TARGET_I}:LRA={LOUDNESS_TARGET_LRA}:TP={LOUDNESS_TARGET_TP}"
+
+
+@dataclass(frozen=True)
+class LoudnessInfo:
+    """First-pass loudnorm measurement of a track"""
+    input_i: float  # Integrated loudness (LUFS)
+    input_tp: float  # True peak (dBTP)
+    input_lra: float  # Loudness range (LU)
+    input_thresh: float
+    target_offset: float
+
+    @property
+    def compliant(self) -> bool:
+        """Already close enough to the target that re-encoding would only add generational loss"""
+        return abs(self.input_i - LOUDNESS_TARGET_I) <= LOUDNESS_TOLERANCE and self.input_tp <= LOUDNESS_TARGET_TP
+
+    def two_pass_filter(self) -> str:
+        """Second-pass loudnorm filter using the measured values (linear, accurate gain)"""
+        return (
+            f"{LOUDNORM_TARGET}"
+            f":measured_I={self.input_i}:measured_TP={self.input_tp}"
+            f":measured_LRA={self.input_lra}:measured_thresh={self.input_thresh}"
+            f":offset={self.target_offset}:linear=true"
+        )
+
+
+_cache: "OrderedDict[str, LoudnessInfo]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def parse_loudnorm_output(output: str) -> Optional[LoudnessInfo]:
+    """Pull the JSON block loudnorm prints at the end of ffmpeg's stderr"""
+    start = output.rfind("{")
+    end = output.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(output[start:end + 1])
+        return LoudnessInfo(
+            input_i=float(data["input_i"]),
+            input_tp=float(data["input_tp"]),
+            input_lra=float(data["input_lra"]),
+            input_thresh=float(data["input_thresh"]),
+            target_offset=float(data["target_offset"]),
+        )
+    except (ValueError, KeyError):
+        # Silent tracks report "-inf"
+        return None
+
+
+def measure_loudness(path: Path, video_id: Optional[str] = None) -> Optional[LoudnessInfo]:
+    """
+    Analyze the first audio stream of path (decode only, no encode).
+    Cached by video_id, so a TikTok is measured once however many times it is processed.
+    Returns None if there is no audio or the analysis fails.
+    """
+    if video_id:
+        cached = cached_loudness(video_id)
+        if cached is not None:
+            return cached
+
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostats', '-i', str(path),
+        '-map', '0:a:0', '-af', f"{LOUDNORM_TARGET}:print_format=json",
+        '-f', 'null', '-'
+    ]
+    try:
+        with metrics.track("ffmpeg_processes"):
+            result = subprocess.run(cmd, capture_output=True, text=True)
+    except Exception as e:
+        if DEBUG_MODE:
+            print(f"Error midiendo la sonoridad: {e}")
+        return None
+    if result.returncode != 0:
+        return None
+
+    info = parse_loudnorm_output(result.stderr)
+    if info is not None and video_id:
+        with _cache_lock:
+            _cache[video_id] = info
+            while len(_cache) > LOUDNESS_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return info
+
+
+def cached_loudness(video_id: str) -> Optional[LoudnessInfo]:
+    """Previous measurement for video_id, if any (no ffmpeg call)"""
+    with _cache_lock:
+        info = _cache.get(video_id)
+        if info is not None:
+            _cache.move_to_end(video_id)
+        return info
+
+
+def audio_args(audio_codec: Optional[str], loudness: Optional[LoudnessInfo], normalize: bool = True) -> List[str]:
+    """
+    FFmpeg audio arguments:
+    copy when normalizing is off or the AAC track is already compliant, two-pass loudnorm
+    when a measurement is available, single-pass loudnorm otherwise.
+    """
+    if not normalize or (loudness is not None and loudness.compliant and audio_codec == 'aac'):
+        return ['-c:a', 'copy']
+    if loudness is not None:
+        return ['-c:a', 'aac', '-af', loudness.two_pass_filter()]
+    return ['-c:a', 'aac', '-af', LOUDNORM_TARGET]
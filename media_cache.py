@@ -0,0 +1,169 @@
+# Media Cache Module
+# Persistent on-disk cache of finished media files with a byte budget and
+# LRU eviction. Entries are published atomically and indexed in memory.
+
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES, AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES
+
+_TMP_PREFIX = ".tmp-"
+
+
+def _link_or_copy(source: Path, dest: Path) -> None:
+    """Hard-link source to dest (no data copied), falling back to a real copy across filesystems"""
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+
+class MediaCache:
+    """
+    Content-addressed file cache.
+
+    Keys are hashed into file names, so any string (e.g. "<video_id>|hd1|<profile>") works.
+    The in-memory index maps file name -> size in LRU order; it is rebuilt at startup
+    from a single directory scan ordered by mtime, which is refreshed on every hit.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, suffix: str = ""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0  # Bytes served from the cache instead of being downloaded again
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._rebuild_index()
+
+    def _name(self, key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:40] + self.suffix
+
+    def _rebuild_index(self) -> None:
+        """Scan the cache directory once; leftover temp files from a crash are removed"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                if entry.name.startswith(_TMP_PREFIX):
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of the cached file for key, or None. Marks the entry as recently used."""
+        name = self._name(key)
+        path = self.directory / name
+        with self._lock:
+            if name not in self._index:
+                self.misses += 1
+                return None
+            try:
+                os.utime(path)  # Persist recency for the next index rebuild
+            except FileNotFoundError:
+                self._total_bytes -= self._index.pop(name)
+                self.misses += 1
+                return None
+            self._index.move_to_end(name)
+            self.hits += 1
+            return path
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        """Materialize the cached file for key at dest (hard link when possible)"""
+        path = self.get(key)
+        if path is None:
+            return False
+        try:
+            _link_or_copy(path, dest)
+            with self._lock:
+                self.bytes_saved += self._index.get(path.name, 0)
+            return True
+        except OSError as e:
+            print(f"Error leyendo de la cache de medios: {e}")
+            return False
+
+    def put(self, key: str, source: Path) -> None:
+        """
+        Publish source under key.
+        The file is staged under a temp name and renamed into place, so readers never see a partial entry.
+        """
+        name = self._name(key)
+        final_path = self.directory / name
+        tmp_path = self.directory / f"{_TMP_PREFIX}{uuid.uuid4().hex}"
+        try:
+            _link_or_copy(source, tmp_path)
+            size = tmp_path.stat().st_size
+            if size > self.max_bytes:
+                tmp_path.unlink()
+                return
+            os.replace(tmp_path, final_path)
+        except OSError as e:
+            print(f"Error guardando en la cache de medios: {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._total_bytes -= self._index.pop(name, 0)
+            self._index[name] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the byte budget is respected"""
+        while self._total_bytes > self.max_bytes and self._index:
+            name, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.directory / name)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes_saved": self.bytes_saved,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+def result_key(video_id: str, hd: int, profile: str) -> str:
+    """Cache key of a transcoded video: TikTok id, quality tier and transcode profile"""
+    return f"{video_id}|hd{hd}|{profile}"
+
+
+result_cache = MediaCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES, suffix=".mp4")
+# Keyed by music_info.id: trending sounds are shared by thousands of TikToks
+audio_cache = MediaCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES, suffix=".mp3")
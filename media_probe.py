@@ -0,0 +1,125 @@
+# Media Probe Module
+# Runs ffprobe once per file (streams + format together) and shares the
+# parsed result with the transcode, progress and upload stages.
+
+import json
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from config import DEBUG_MODE
+
+_PROBE_CACHE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """What ffprobe knows about a media file"""
+    codec: str = 'unknown'  # Video codec name, 'unknown' if there is no readable video stream
+    bitrate: Optional[int] = None  # Video bitrate in bits/s (stream value, else container value)
+    duration: float = 0.0  # Seconds
+    width: int = 0
+    height: int = 0
+    audio_codec: Optional[str] = None  # None if the file has no audio stream
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+
+_cache: "OrderedDict[tuple, MediaInfo]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_probe_output(probe_data: dict) -> MediaInfo:
+    """Build a MediaInfo from ffprobe's JSON (-show_streams -show_format)"""
+    streams = probe_data.get('streams') or []
+    fmt = probe_data.get('format') or {}
+    video = next((st for st in streams if st.get('codec_type') == 'video'), None)
+    audio = next((st for st in streams if st.get('codec_type') == 'audio'), None)
+
+    if video is None:
+        return MediaInfo(
+            duration=_to_float(fmt.get('duration')),
+            audio_codec=audio.get('codec_name') if audio else None
+        )
+
+    return MediaInfo(
+        codec=video.get('codec_name', 'unknown'),
+        bitrate=_to_int(video.get('bit_rate')) or _to_int(fmt.get('bit_rate')),
+        duration=_to_float(video.get('duration')) or _to_float(fmt.get('duration')),
+        width=_to_int(video.get('width')) or 0,
+        height=_to_int(video.get('height')) or 0,
+        audio_codec=audio.get('codec_name') if audio else None
+    )
+
+
+def probe_media(path: Path) -> MediaInfo:
+    """
+    Probe a file with a single ffprobe call.
+    Results are cached by path, size and mtime, so probing an unchanged file again is free.
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return MediaInfo()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    probe_cmd = [
+        'ffprobe', '-v', 'quiet', '-print_format', 'json',
+        '-show_streams', '-show_format', str(path)
+    ]
+    try:
+        result = subprocess.run(probe_cmd, capture_output=True, text=True)
+        info = parse_probe_output(json.loads(result.stdout or '{}'))
+    except Exception as e:
+        if DEBUG_MODE:
+            print(f"Error ejecutando ffprobe: {e}")
+        return MediaInfo()
+
+    with _cache_lock:
+        _cache[key] = info
+        while len(_cache) > _PROBE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return info
+
+
+def probe_bytes(data: bytes) -> MediaInfo:
+    """
+    Probe the first bytes of a download fed through stdin.
+    Only works when the container index comes first (faststart MP4); otherwise codec is 'unknown'.
+    """
+    probe_cmd = [
+        'ffprobe', '-v', 'quiet', '-print_format', 'json',
+        '-show_streams', '-show_format', '-i', 'pipe:0'
+    ]
+    try:
+        result = subprocess.run(probe_cmd, input=data, capture_output=True)
+        return parse_probe_output(json.loads(result.stdout or b'{}'))
+    except Exception as e:
+        if DEBUG_MODE:
+            print(f"Error ejecutando ffprobe sobre stdin: {e}")
+        return MediaInfo()
@@ -0,0 +1,161 @@
+# Metadata Cache Module
+# Short-lived in-memory cache of tikwm API responses keyed by video id, plus
+# a memo of short links (vm/vt.tiktok.com, tiktok.com/t/) to the id they resolve to.
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from config import (
+    TIKTOK_PATTERNS,
+    METADATA_CACHE_TTL, METADATA_CACHE_MAX_ENTRIES,
+    SHORT_LINK_TTL, SHORT_LINK_MAX_ENTRIES,
+    CDN_EXPIRY_MARGIN,
+)
+
+# Response fields holding signed CDN URLs
+_URL_FIELDS = ("play", "wmplay", "hdplay", "music")
+# Query parameters TikTok's CDNs use for the signature expiry (unix time)
+_EXPIRY_PARAMS = ("x-expires", "expire", "expires")
+# Short link patterns are the TIKTOK_PATTERNS entries that don't carry the id
+_SHORT_LINK_PATTERNS = [re.compile(p) for p in TIKTOK_PATTERNS if "video" not in p]
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a TikTok link for use as a memo key (no scheme, query, fragment or trailing slash)"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return f"{host}{parts.path.rstrip('/')}"
+
+
+def is_short_link(url: str) -> bool:
+    """True for share links that need a lookup to know the video id"""
+    return any(p.match(url) for p in _SHORT_LINK_PATTERNS)
+
+
+def cdn_expiry(info: dict) -> Optional[float]:
+    """Earliest expiry (unix time) of the signed URLs in an API response, None if unsigned"""
+    urls = [info.get(f) for f in _URL_FIELDS] + list(info.get("images") or [])
+    expiries = []
+    for url in urls:
+        if not isinstance(url, str):
+            continue
+        query = parse_qs(urlsplit(url).query)
+        for param in _EXPIRY_PARAMS:
+            try:
+                expiries.append(float(query[param][0]))
+                break
+            except (KeyError, ValueError):
+                continue
+    return min(expiries) if expiries else None
+
+
+class MetadataCache:
+    """
+    Thread-safe LRU cache of API responses.
+
+    An entry lives METADATA_CACHE_TTL seconds, or less if one of its signed CDN
+    URLs expires earlier (minus CDN_EXPIRY_MARGIN so a download never starts on a dead URL).
+    An hd=1 response is a superset of the hd=0 one (it carries 'play' as well as 'hdplay'),
+    so it also answers hd=0 lookups.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, link_ttl: float, max_links: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.link_ttl = link_ttl
+        self.max_links = max_links
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[dict, float]]" = OrderedDict()
+        self._links: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.link_hits = 0
+
+    def resolve(self, url: str) -> Optional[str]:
+        """Video id a short link was previously resolved to"""
+        key = canonical_url(url)
+        with self._lock:
+            memo = self._links.get(key)
+            if memo is None:
+                return None
+            video_id, expires_at = memo
+            if time.time() >= expires_at:
+                del self._links[key]
+                return None
+            self._links.move_to_end(key)
+            self.link_hits += 1
+            return video_id
+
+    def _lookup(self, key: Tuple[str, int], now: float) -> Optional[dict]:
+        """Live entry for key, dropping it if expired. Must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        info, expires_at = entry
+        if now >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return info
+
+    def get(self, video_id: str, hd: int = 1) -> Optional[dict]:
+        """Cached API response for video_id, or None"""
+        now = time.time()
+        with self._lock:
+            info = self._lookup((video_id, hd), now)
+            if info is None and not hd:
+                info = self._lookup((video_id, 1), now)
+            if info is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(info)
+
+    def put(self, url: str, hd: int, info: dict) -> None:
+        """Store an API response; short links are memoized to the id it names"""
+        video_id = str(info.get("id") or "")
+        if not video_id:
+            return
+
+        now = time.time()
+        expires_at = now + self.ttl
+        cdn_expires = cdn_expiry(info)
+        if cdn_expires is not None:
+            expires_at = min(expires_at, cdn_expires - CDN_EXPIRY_MARGIN)
+
+        with self._lock:
+            if expires_at > now:
+                self._entries[(video_id, hd)] = (dict(info), expires_at)
+                self._entries.move_to_end((video_id, hd))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+            # The link -> id mapping doesn't expire with the CDN URLs
+            if is_short_link(url):
+                key = canonical_url(url)
+                self._links[key] = (video_id, now + self.link_ttl)
+                self._links.move_to_end(key)
+                while len(self._links) > self.max_links:
+                    self._links.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "short_links": len(self._links),
+                "hits": self.hits,
+                "misses": self.misses,
+                "short_link_hits": self.link_hits,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+metadata_cache = MetadataCache(METADATA_CACHE_TTL, METADATA_CACHE_MAX_ENTRIES, SHORT_LINK_TTL, SHORT_LINK_MAX_ENTRIES)
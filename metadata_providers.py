@@ -0,0 +1,260 @@
+# Metadata Providers Module
+# Sources of TikTok video info (tikwm.com first) behind one interface, and a
+# chain that hedges a slow provider with the next one to cut tail latency.
+
+import asyncio
+import json
+import math
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Union
+
+import http_session
+from config import (
+    DEBUG_MODE,
+    METADATA_PROVIDERS, METADATA_TIMEOUT,
+    METADATA_HEDGE_DEFAULT_DELAY, METADATA_HEDGE_MIN_SAMPLES, METADATA_LATENCY_WINDOW,
+    TIKWM_THROTTLE_RETRIES, TIKWM_BREAKER_THRESHOLD, TIKWM_BREAKER_COOLDOWN,
+)
+from rate_limit import CircuitBreaker, tikwm_bucket
+
+
+class MetadataProvider(ABC):
+    """
+    A source of video info in tikwm's response format (the 'data' object).
+    Subclasses implement _fetch(); fetch() adds latency tracking for hedging.
+    """
+
+    name = "provider"
+
+    def __init__(self):
+        self._latencies: Deque[float] = deque(maxlen=METADATA_LATENCY_WINDOW)
+        self.requests = 0
+        self.answers = 0
+
+    @abstractmethod
+    async def _fetch(self, url: str, hd: int) -> Optional[dict]:
+        """Video info for url from this source, or None"""
+
+    async def fetch(self, url: str, hd: int = 1) -> Optional[dict]:
+        """Video info for url, or None if this provider can't answer"""
+        self.requests += 1
+        start = time.perf_counter()
+        info = await self._fetch(url, hd)
+        if info is not None:
+            self.answers += 1
+            self._latencies.append(time.perf_counter() - start)
+        return info
+
+    def p95(self) -> Optional[float]:
+        """95th percentile of recent answer latencies, None until there are enough samples"""
+        if len(self._latencies) < METADATA_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        return {
+            "requests": self.requests,
+            "answers": self.answers,
+            "p95": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class TikwmProvider(MetadataProvider):
+    """
+    tikwm.com API.
+    Requests share the process-wide tikwm token bucket; each endpoint has its own circuit breaker.
+    """
+
+    name = "tikwm"
+
+    def __init__(self, api_url: str = "https://www.tikwm.com/api/"):
+        super().__init__()
+        self.api_url = api_url
+        self.breaker = CircuitBreaker(TIKWM_BREAKER_THRESHOLD, TIKWM_BREAKER_COOLDOWN)
+
+    async def _fetch(self, url: str, hd: int) -> Optional[dict]:
+        """
+        Up to TIKWM_THROTTLE_RETRIES + 1 single-shot requests (the session doesn't retry tikwm calls).
+        Every attempt takes a tikwm_bucket token and records one breaker outcome; transport errors,
+        throttles and 5xx are retried with backoff while the breaker still allows calls.
+        """
+        for attempt in range(TIKWM_THROTTLE_RETRIES + 1):
+            if not self.breaker.allow():
+                print("API de tikwm no disponible (circuito abierto), se omite la consulta")
+                return None
+            if attempt:
+                await asyncio.sleep(http_session.backoff_delay(attempt - 1))
+
+            await tikwm_bucket.acquire()
+            try:
+                response = await http_session.request(
+                    "POST",
+                    self.api_url,
+                    retry=False,
+                    data={"url": url, "hd": hd},
+                    headers={"Accept": "application/json"},
+                    timeout=METADATA_TIMEOUT
+                )
+                data = response.json() if response.status_code < 400 else {}
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            except Exception as e:
+                self.breaker.record_failure()
+                print(f"Error getting TikTok info: {e}")
+                continue
+
+            if is_throttled(response, data):
+                tikwm_bucket.drain()
+                self.breaker.record_failure()
+                print(f"Error getting TikTok info: tikwm limita las peticiones ({data.get('msg') or response.status_code})")
+                continue
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                print(f"Error getting TikTok info: HTTP {response.status_code}")
+                continue
+
+            # The API answered: an invalid or private video is not an outage
+            self.breaker.record_success()
+            if data.get("code") == 0 and data.get("data"):
+                if DEBUG_MODE:
+                    print("=== TIKWM API RESPONSE ===")
+                    print(json.dumps(data["data"], indent=2, ensure_ascii=True))
+                return data["data"]
+            return None
+        return None
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["breaker"] = self.breaker.stats()
+        return stats
+
+
+def is_throttled(response, data: dict) -> bool:
+    """tikwm throttles with HTTP 429 or with a 200 carrying code != 0 and a 'Free Api Limit' message"""
+    if response.status_code == 429:
+        return True
+    return data.get("code") != 0 and "limit" in str(data.get("msg", "")).lower()
+
+
+class LocalProvider(MetadataProvider):
+    """
+    Canned responses for tests and benchmarks, no network involved.
+    fixtures maps a TikTok URL or video id to its info; it can be a dict or the path of a JSON file.
+    """
+
+    name = "local"
+
+    def __init__(self, fixtures: Union[Dict[str, dict], str, Path], delay: float = 0.0):
+        super().__init__()
+        if not isinstance(fixtures, dict):
+            with open(fixtures, "r", encoding="utf-8") as f:
+                fixtures = json.load(f)
+        self.fixtures = fixtures
+        self.delay = delay
+
+    async def _fetch(self, url: str, hd: int) -> Optional[dict]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        info = self.fixtures.get(url)
+        match = re.search(r'/video/(\d+)', url)
+        if info is None and match:
+            info = self.fixtures.get(match.group(1))
+        return dict(info) if info is not None else None
+
+
+PROVIDER_TYPES = {
+    "tikwm": TikwmProvider,
+    "local": LocalProvider,
+}
+
+
+class ProviderChain:
+    """
+    Asks providers in order and returns the first answer.
+    If the current provider hasn't answered within its p95 latency, the next one is started
+    in parallel (a hedged request) and whichever answers first wins; a provider that fails
+    hands over to the next one immediately. Losing requests are cancelled.
+    """
+
+    def __init__(self, providers: List[MetadataProvider]):
+        self.providers = providers
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.wins: Dict[str, int] = {}
+
+    def hedge_delay(self, provider: MetadataProvider) -> float:
+        """Seconds to wait on provider before hedging"""
+        p95 = provider.p95()
+        return p95 if p95 is not None else METADATA_HEDGE_DEFAULT_DELAY
+
+    async def fetch(self, url: str, hd: int = 1) -> Optional[dict]:
+        """First answer from the providers, or None if none of them could answer"""
+        pending: Dict[asyncio.Task, int] = {}
+        next_index = 0
+
+        def launch() -> None:
+            nonlocal next_index
+            provider = self.providers[next_index]
+            pending[asyncio.create_task(provider.fetch(url, hd))] = next_index
+            next_index += 1
+
+        if not self.providers:
+            return None
+        launch()
+        try:
+            while pending:
+                more = next_index < len(self.providers)
+                timeout = self.hedge_delay(self.providers[next_index - 1]) if more else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Slow answer: hedge with the next provider
+                    self.hedges += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    index = pending.pop(task)
+                    try:
+                        info = task.result()
+                    except Exception as e:
+                        print(f"Error en el proveedor {self.providers[index].name}: {e}")
+                        info = None
+                    if info is not None:
+                        name = self.providers[index].name
+                        self.wins[name] = self.wins.get(name, 0) + 1
+                        if index > 0:
+                            self.hedge_wins += 1
+                        return info
+
+                # Every running provider failed: fall through to the next one
+                if not pending and next_index < len(self.providers):
+                    launch()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "wins": dict(self.wins),
+            "providers": {p.name: p.stats() for p in self.providers},
+        }
+
+
+def build_chain(specs) -> ProviderChain:
+    """Build the chain from config entries: (type, argument) pairs, e.g. ("tikwm", api_url)"""
+    return ProviderChain([PROVIDER_TYPES[kind](*args) for kind, *args in specs])
+
+
+metadata_chain = build_chain(METADATA_PROVIDERS)
@@ -0,0 +1,189 @@
+# Metrics Module
+# Process-wide counters, gauges and per-stage latency histograms fed by the
+# download pipeline, rendered in the Prometheus text format for /metrics
+# together with the stats() of every cache, limiter and scheduler.
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from config import METRICS_PREFIX, METRICS_BUCKETS
+
+# (metric name, sorted label pairs)
+SampleKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, str]) -> SampleKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _metric_name(text: str) -> str:
+    return "".join(c if c.isalnum() or c == "_" else "_" for c in str(text)).lower()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram of one stage"""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    """
+    Thread-safe registry (ffmpeg runs in worker threads).
+    Stats sources are the stats() methods of the bot's components; nested dicts listed
+    in their label map become labelled samples (e.g. by_host -> host="...").
+    """
+
+    def __init__(self, prefix: str, buckets: List[float]):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[SampleKey, float] = {}
+        self._gauges: Dict[SampleKey, float] = {}
+        self._sources: Dict[str, Tuple[Callable[[], dict], Dict[str, str]]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record the duration of one run of a pipeline stage"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def error(self, stage: str) -> None:
+        self.inc("errors_total", stage=stage)
+
+    @contextmanager
+    def timer(self, stage: str, expected: Tuple[type, ...] = ()) -> Iterator[None]:
+        """
+        Observe the block's duration under stage; an exception escaping it counts as an error of stage
+        unless it is one of the expected types (refusals such as a full queue, not failures).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except expected:
+            raise
+        except BaseException:
+            self.error(stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def track(self, name: str, **labels) -> Iterator[None]:
+        """Gauge of how many blocks are currently running (e.g. ffmpeg processes)"""
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._gauges[key] -= 1
+
+    def register(self, component: str, stats: Callable[[], dict], labels: Optional[Dict[str, str]] = None) -> None:
+        """
+        Export a component's stats() dict as gauges named <prefix>_<component>_<key>.
+        labels maps keys whose value is a dict keyed by free-form names to the label name to use.
+        """
+        self._sources[component] = (stats, labels or {})
+
+    def _source_samples(self, name: str, stats: dict, label_keys: Dict[str, str], labels: Dict[str, str]):
+        for key, value in stats.items():
+            sample = f"{name}_{_metric_name(key)}"
+            if isinstance(value, dict):
+                if key in label_keys:
+                    for sub, sub_value in value.items():
+                        sub_labels = {**labels, label_keys[key]: sub}
+                        if isinstance(sub_value, dict):
+                            yield from self._source_samples(sample, sub_value, label_keys, sub_labels)
+                        else:
+                            yield from self._source_samples(name, {key: sub_value}, {}, sub_labels)
+                else:
+                    yield from self._source_samples(sample, value, label_keys, labels)
+            elif isinstance(value, str):
+                # States (breaker state, last preset) as a 1-valued sample carrying the value
+                yield sample, {**labels, _metric_name(key): value}, 1
+            elif isinstance(value, (int, float)):
+                yield sample, labels, value
+            # None: nothing measured yet
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        p = self.prefix
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.count, h.sum) for stage, h in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        if histograms:
+            lines.append(f"# HELP {p}_stage_seconds Duration of each pipeline stage")
+            lines.append(f"# TYPE {p}_stage_seconds histogram")
+            for stage, (counts, count, total) in sorted(histograms.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {bucket_count}')
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {round(total, 6)}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        for kind, samples in (("counter", counters), ("gauge", gauges)):
+            typed = set()
+            for (name, labels), value in sorted(samples.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {p}_{name} {kind}")
+                lines.append(f"{p}_{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for component, (stats, label_keys) in sorted(self._sources.items()):
+            try:
+                samples = list(self._source_samples(f"{p}_{_metric_name(component)}", stats(), label_keys, {}))
+            except Exception as e:
+                lines.append(f"# {component}: stats() failed: {e}")
+                continue
+            typed = set()
+            for name, labels, value in samples:
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(METRICS_PREFIX, METRICS_BUCKETS)
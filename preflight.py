@@ -0,0 +1,145 @@
+# Preflight Module
+# Decides, before anything is downloaded, which quality tier of a TikTok to
+# fetch and whether the result can fit under Telegram's upload limit.
+# Also holds the bitrate math and miss counters of size-targeted encodes.
+
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+import http_session
+from config import (
+    TELEGRAM_MAX_UPLOAD, PREFLIGHT_SIZE_MARGIN, PREFLIGHT_AUDIO_BITRATE, PREFLIGHT_MIN_VIDEO_BITRATE,
+    SIZE_FALLBACK_STEP,
+)
+
+
+class TooLargeError(Exception):
+    """Raised when no quality tier can be sent to Telegram, even re-encoded"""
+
+    def __init__(self, size: Optional[int] = None):
+        size_text = f" ({size / (1024 * 1024):.0f}MB)" if size else ""
+        super().__init__(
+            f"El video es demasiado grande{size_text}.\n"
+            f"Telegram tiene un límite de {TELEGRAM_MAX_UPLOAD // (1024 * 1024)}MB para bots."
+        )
+
+
+@dataclass
+class DownloadPlan:
+    """Which file to download and how to encode it"""
+    tier: int  # 1 = hdplay, 0 = play
+    url: str
+    size: Optional[int] = None  # Bytes of the source file, None if unknown
+    target_bitrate: Optional[int] = None  # Video bits/s needed to fit the upload limit, None to keep the source bitrate
+
+
+class SizeTargetStats:
+    """How often size-targeted encodes land over the limit"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0  # Outputs checked against the limit
+        self.first_misses = 0  # Over the limit after the first encode
+        self.final_misses = 0  # Still over the limit after the fallback step
+
+    def record_check(self) -> None:
+        with self._lock:
+            self.checked += 1
+
+    def record_first_miss(self) -> None:
+        with self._lock:
+            self.first_misses += 1
+
+    def record_final_miss(self) -> None:
+        with self._lock:
+            self.final_misses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "first_misses": self.first_misses,
+                "final_misses": self.final_misses,
+                "first_miss_rate": round(self.first_misses / self.checked, 3) if self.checked else 0.0,
+            }
+
+
+size_target_stats = SizeTargetStats()
+
+
+def target_video_bitrate(duration: float, max_bytes: int = TELEGRAM_MAX_UPLOAD) -> Optional[int]:
+    """Video bits/s that keeps duration seconds of video plus AAC audio under max_bytes, None if duration is unknown"""
+    if duration <= 0:
+        return None
+    return int(max_bytes * PREFLIGHT_SIZE_MARGIN * 8 / duration) - PREFLIGHT_AUDIO_BITRATE
+
+
+def fallback_bitrate(used_bitrate: Optional[int], duration: float, output_size: int, max_bytes: int) -> Optional[int]:
+    """Bitrate for the retry of an encode that came out output_size bytes: scaled down by the overshoot"""
+    bitrate = target_video_bitrate(duration, max_bytes)
+    if bitrate is None:
+        return None
+    if used_bitrate:
+        bitrate = min(bitrate, int(used_bitrate * max_bytes * PREFLIGHT_SIZE_MARGIN / output_size * SIZE_FALLBACK_STEP))
+    return bitrate
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value) or None
+    except (TypeError, ValueError):
+        return None
+
+
+async def remote_size(url: str) -> Optional[int]:
+    """
+    Size of a remote file without downloading it.
+    Tries HEAD first; CDNs that don't answer HEAD properly get a one-byte range request.
+    """
+    try:
+        response = await http_session.request("HEAD", url, timeout=10)
+        size = _to_int(response.headers.get("content-length")) if response.status_code < 400 else None
+        if size:
+            return size
+        async with http_session.stream("GET", url, headers={"Range": "bytes=0-0"}, timeout=10) as response:
+            # Content-Range: bytes 0-0/123456
+            total = response.headers.get("content-range", "").rpartition("/")[2]
+            return _to_int(total)
+    except httpx.HTTPError:
+        return None
+
+
+async def plan_download(info: dict) -> DownloadPlan:
+    """
+    Pick the quality tier to download from tikwm's size/hd_size/duration fields,
+    asking the CDN only when the API didn't report a size.
+
+    The best tier that fits under the upload limit wins. If none fits, the smallest one
+    is planned with a target bitrate computed from the duration, and TooLargeError is
+    raised when even that bitrate would be too low to watch.
+    """
+    limit = TELEGRAM_MAX_UPLOAD * PREFLIGHT_SIZE_MARGIN
+    tiers = [(1, info.get("hdplay"), info.get("hd_size")), (0, info.get("play"), info.get("size"))]
+    plans = []
+    for tier, url, size in tiers:
+        if not url or any(p.url == url for p in plans):
+            continue
+        size = _to_int(size) or await remote_size(url)
+        plan = DownloadPlan(tier=tier, url=url, size=size)
+        if size is None or size <= limit:
+            # Unknown sizes keep the old behavior: download and check afterwards
+            return plan
+        plans.append(plan)
+
+    if not plans:
+        raise ValueError("No se encontró URL de descarga del video")
+
+    smallest = min(plans, key=lambda p: p.size)
+    target = target_video_bitrate(float(info.get("duration") or 0))
+    if target is None or target < PREFLIGHT_MIN_VIDEO_BITRATE:
+        raise TooLargeError(smallest.size)
+    smallest.target_bitrate = target
+    return smallest
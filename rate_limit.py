@@ -0,0 +1,140 @@
+# Rate Limit Module
+# Client-side governor for the tikwm API: a token bucket shared by every job
+# and circuit breakers that fail fast while an endpoint is down.
+
+import asyncio
+import threading
+import time
+
+from config import TIKWM_RATE, TIKWM_BURST
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    Callers reserve a token and sleep off the deficit, so waiters are served in arrival
+    order and the long-run request rate never exceeds rate per second.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.delayed = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+
+    def reserve(self) -> float:
+        """Take one token, returning how many seconds the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            self.acquired += 1
+            wait = max(0.0, -self._tokens / self.rate)
+            if wait:
+                self.delayed += 1
+                self.wait_seconds += wait
+            return wait
+
+    async def acquire(self) -> None:
+        """Wait for a token without blocking the event loop"""
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def drain(self) -> None:
+        """Empty the bucket after the server throttled us, so the next callers slow down"""
+        with self._lock:
+            self.throttled += 1
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "acquired": self.acquired,
+                "delayed": self.delayed,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "throttled": self.throttled,
+            }
+
+
+class CircuitBreaker:
+    """
+    Opens after threshold consecutive failures and rejects calls for cooldown seconds.
+    Then a single trial call is let through (half-open): success closes the circuit, failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """True if a call may go out now"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            self._failures = 0
+            self.state = self.CLOSED
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def abandon(self) -> None:
+        """Forget a call that was cancelled before it had an outcome, so a half-open circuit can retry"""
+        with self._lock:
+            self._trial_running = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "successes": self.successes,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "opened": self.opened,
+            }
+
+
+tikwm_bucket = TokenBucket(TIKWM_RATE, TIKWM_BURST)
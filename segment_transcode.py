@@ -0,0 +1,98 @@
+# Segment Transcode Module
+# Splits a long video at keyframes, encodes the pieces in parallel ffmpeg
+# processes and joins them back without re-encoding.
+
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from config import DEBUG_MODE
+from metrics import metrics
+
+
+def _run(cmd: List[str]) -> None:
+    """Run an ffmpeg command quietly, raising with its last stderr line on failure"""
+    with metrics.track("ffmpeg_processes"):
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        detail = result.stderr.strip().splitlines()[-1:] or ["sin detalles"]
+        raise Exception(f"FFmpeg falló ({result.returncode}): {detail[0]}")
+    if DEBUG_MODE and result.stderr:
+        print(result.stderr)
+
+
+def split_at_keyframes(source: Path, work_dir: Path, segment_seconds: float) -> List[Path]:
+    """
+    Cut the video stream of source into pieces of about segment_seconds.
+    Stream copy, so cuts land on the next keyframe and cost no encoding.
+    """
+    pattern = work_dir / "seg_%04d.mp4"
+    _run([
+        'ffmpeg', '-y', '-i', str(source),
+        '-map', '0:v:0', '-c', 'copy',
+        '-f', 'segment', '-segment_time', str(segment_seconds), '-reset_timestamps', '1',
+        str(pattern)
+    ])
+    return sorted(work_dir.glob("seg_*.mp4"))
+
+
+def with_threads(cmd: List[str], threads: int) -> List[str]:
+    """Insert an encoder thread cap right before the output path"""
+    return cmd[:-1] + ['-threads', str(threads), cmd[-1]]
+
+
+def concat_segments(segments: List[Path], audio: Optional[Path], output: Path, work_dir: Path) -> None:
+    """Join encoded segments (and the separately processed audio) without re-encoding"""
+    list_file = work_dir / "segments.txt"
+    list_file.write_text("".join(f"file '{seg.resolve()}'\n" for seg in segments), encoding="utf-8")
+    cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', str(list_file)]
+    if audio is not None:
+        cmd.extend(['-i', str(audio), '-map', '0:v:0', '-map', '1:a:0'])
+    cmd.extend(['-c', 'copy', '-movflags', '+faststart', str(output)])
+    _run(cmd)
+
+
+def transcode_segments(
+    source: Path,
+    output: Path,
+    work_dir: Path,
+    segment_seconds: float,
+    workers: int,
+    video_cmd: Callable[[Path, Path], List[str]],
+    audio_cmd: Optional[Callable[[Path], List[str]]] = None,
+    progress_callback: Optional[Callable[[str], None]] = None,
+) -> None:
+    """
+    Segment-parallel encode of source into output.
+    video_cmd(segment, encoded_segment) builds the encode command of one video segment;
+    audio_cmd(audio_output) builds the single command that processes the whole audio track,
+    which runs alongside the segments so loudness is normalized over the full track.
+    """
+    work_dir.mkdir(parents=True, exist_ok=True)
+    segments = split_at_keyframes(source, work_dir, segment_seconds)
+    if not segments:
+        raise Exception("No se pudo dividir el video en segmentos")
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    encoded = [seg.with_name(f"enc_{seg.name}") for seg in segments]
+    audio_path = work_dir / "audio.m4a" if audio_cmd is not None else None
+    done = [0]
+
+    def encode(index: int) -> None:
+        _run(with_threads(video_cmd(segments[index], encoded[index]), threads))
+        done[0] += 1
+        if progress_callback:
+            percent = int(done[0] * 100 / len(segments))
+            progress_callback(f"⚙️ [2/2] Transcodificando en paralelo ({workers} procesos)... {percent}%")
+
+    # Each task just waits on its own ffmpeg process, so threads are enough to drive them
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(encode, i) for i in range(len(segments))]
+        if audio_path is not None:
+            jobs.append(pool.submit(_run, audio_cmd(audio_path)))
+        for job in jobs:
+            job.result()
+
+    concat_segments(encoded, audio_path, output, work_dir)
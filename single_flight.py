@@ -0,0 +1,60 @@
+# Single-flight Request Coalescing
+# Concurrent requests for the same key share one in-flight job instead of
+# each running their own download and transcode.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Runs at most one job per key at a time.
+    Callers arriving while a job is in flight await its result instead of starting another one.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def in_flight(self, key: str) -> bool:
+        """True if a job for key is currently running"""
+        return key in self._inflight
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run factory() for key, or join the job already running for it.
+        Returns (result, shared) where shared is True if the result came from another caller's job.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.followers += 1
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.leaders += 1
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            # Only the leader was cancelled: followers get a normal error they can report to their user
+            future.set_exception(RuntimeError("El procesamiento de este video se interrumpió. Intenta de nuevo."))
+            future.exception()  # Mark as retrieved in case nobody joined
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved in case nobody joined
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        """How many jobs ran and how many callers were coalesced into them"""
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
@@ -0,0 +1,65 @@
+# System Info Module
+# Cheap readings of host load and process memory used by the adaptive
+# policies and per-job reports.
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+def cpu_load() -> Optional[float]:
+    """
+    1-minute load average per core (1.0 = every core busy).
+    None where the OS doesn't report load averages.
+    """
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def current_rss() -> Optional[int]:
+    """Resident memory of this process in bytes, None where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class PeakRss:
+    """Highest resident memory seen while a job runs (see sample_peak_rss)"""
+
+    def __init__(self):
+        self.start = current_rss()
+        self.peak = self.start
+
+    def sample(self) -> None:
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __str__(self) -> str:
+        if self.peak is None:
+            return "RSS no disponible"
+        start = self.start or 0
+        return f"RSS pico {self.peak / 1048576:.1f} MB (+{(self.peak - start) / 1048576:.1f} MB)"
+
+
+@asynccontextmanager
+async def sample_peak_rss(interval: float = 0.05) -> AsyncIterator[PeakRss]:
+    """Sample RSS from a background task every interval seconds while the block runs"""
+    peak = PeakRss()
+
+    async def sampler() -> None:
+        while True:
+            await asyncio.sleep(interval)
+            peak.sample()
+
+    task = asyncio.create_task(sampler())
+    try:
+        yield peak
+    finally:
+        task.cancel()
+        peak.sample()
@@ -3,13 +3,33 @@
 
 import os
 import re
-import json
+import asyncio
+import shutil
 import subprocess
-import requests
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from dataclasses import dataclass
-from typing import Optional, List, Callable
-from config import DOWNLOAD_DIR, DEBUG_MODE
+from dataclasses import dataclass, field, replace
+from typing import Optional, List, Callable, Dict, Iterator, Tuple, Awaitable
+from config import (
+    DOWNLOAD_DIR, DEBUG_MODE, SLIDESHOW_CONCURRENCY, STREAM_TRANSCODE, STREAM_PROBE_BYTES,
+    TELEGRAM_MAX_UPLOAD, PREFLIGHT_SIZE_MARGIN, PREFLIGHT_MIN_VIDEO_BITRATE,
+    SEGMENT_MIN_DURATION, SEGMENT_SECONDS, SEGMENT_MAX_WORKERS,
+)
+from workspace import create_workspace, remove_workspace
+import http_session
+from http_session import run_sync, track_connections
+from media_probe import MediaInfo, probe_media, probe_bytes
+from transcode_scheduler import transcode_scheduler, QueueFullError
+from media_cache import result_cache, result_key, audio_cache
+from metadata_cache import metadata_cache
+from metadata_providers import metadata_chain
+from segment_transcode import transcode_segments
+from encoder_policy import encoder_policy
+from loudness import LoudnessInfo, LOUDNORM_TARGET, measure_loudness, cached_loudness, audio_args
+from metrics import metrics
+from tracing import span, annotate, accumulate
+from preflight import plan_download, TooLargeError, target_video_bitrate, fallback_bitrate, size_target_stats
 
 # Opcional: importar bmf si est\u00e1 disponible para decodificaci\u00f3n ByteVC2
 try:
@@ -29,41 +49,34 @@ class DownloadResult:
     title: str = ""
     author: str = ""
     error: Optional[str] = None
+    workspace: Optional[str] = None  # Job directory holding the files, owned by the caller
+    video_id: str = ""  # TikTok id, used as cache key
+    music_id: str = ""  # music_info.id of the sound, shared by every TikTok using it
+    connections: int = 0  # New TCP/TLS handshakes made by this job
+    media: Optional[MediaInfo] = None  # Probe data of the final video (duration, dimensions...)
+    timings: Dict[str, float] = field(default_factory=dict)  # Seconds spent per stage
 
 
 def clean_downloads():
-    """Clean all files in the download directory"""
+    """
+    Clean everything in the download directory, including job workspaces.
+    Only safe when no jobs are running (startup or standalone scripts).
+    """
     if DEBUG_MODE:
         return
         
     for file in DOWNLOAD_DIR.glob("*"):
         try:
-            file.unlink()
+            if file.is_dir():
+                shutil.rmtree(file, ignore_errors=True)
+            else:
+                file.unlink()
         except Exception:
             pass
 
 
-def detect_video_codec(video_path: Path) -> str:
-    """Detects the video codec using ffprobe"""
-    try:
-        probe_cmd = [
-            'ffprobe', '-v', 'quiet', '-print_format', 'json',
-            '-show_streams', '-select_streams', 'v:0', str(video_path)
-        ]
-        result = subprocess.run(probe_cmd, capture_output=True, text=True)
-        probe_data = json.loads(result.stdout)
-        
-        if probe_data.get('streams') and len(probe_data['streams']) > 0:
-            return probe_data['streams'][0].get('codec_name', 'unknown')
-        return 'unknown'
-    except Exception as e:
-        if DEBUG_MODE:
-            print(f"Error detectando codec: {e}")
-        return 'unknown'
-
-
-def transcode_with_bmf(video_path: Path, output_path: Path, progress_callback: Optional[Callable[[str], None]] = None) -> bool:
-    """Uses BMF to decode ByteVC2 and encode to H.264"""
+def transcode_with_bmf(video_path: Path, output_path: Path, progress_callback: Optional[Callable[[str], None]] = None, preset: Optional[str] = None) -> bool:
+    """Uses BMF to decode ByteVC2 and encode to H.264 (preset defaults to the encoder policy's choice)"""
     if not HAS_BMF:
         raise Exception("BMF no est\u00e1 instalado.")
         
@@ -78,7 +91,8 @@ def transcode_with_bmf(video_path: Path, output_path: Path, progress_callback: O
         video = graph.decode({"input_path": str(video_path)})
         
         # Audio normalization string
-        audio_filter = "loudnorm=I=-16:LRA=11:TP=-1.5"
+        audio_filter = LOUDNORM_TARGET
+        preset = preset or encoder_policy.choose()
         
         # Encode output
         bmf.encode(
@@ -88,7 +102,7 @@ def transcode_with_bmf(video_path: Path, output_path: Path, progress_callback: O
                 "output_path": str(output_path),
                 "video_params": {
                     "codec": "libx264",
-                    "preset": "fast",
+                    "preset": preset,
                     "profile": "main",
                     "pix_fmt": "yuv420p",
                     "crf": "23" # Fallback if we don't set exact bitrate
@@ -107,19 +121,263 @@ def transcode_with_bmf(video_path: Path, output_path: Path, progress_callback: O
         raise e
 
 
-def transcode_and_normalize(video_path: Path, progress_callback: Optional[Callable[[str], None]] = None):
+def needs_bmf(codec: str) -> bool:
+    """ByteVC2 (and unreadable) streams go through BMF when it is installed"""
+    return codec in ['bvc2', 'bytevc2', 'unknown'] and HAS_BMF
+
+
+# Expected refusals of a job (bot saturated, video too large): answered to the user, not pipeline errors
+REJECTIONS = (QueueFullError, TooLargeError)
+
+
+# Identifies the output produced by build_ffmpeg_command/BMF; bump it when the output changes
+# so the result cache stops serving files made with the old settings.
+TRANSCODE_PROFILE = "h264main-aac-loudnorm16-v2"
+
+
+def build_ffmpeg_command(input_arg: str, media: MediaInfo, output_path: Path, target_bitrate: Optional[int] = None, normalize_audio: bool = True, loudness: Optional[LoudnessInfo] = None, preset: Optional[str] = None) -> List[str]:
+    """
+    FFmpeg command that copies H.264 (or transcodes anything else to H.264) and normalizes audio.
+    input_arg is a file path or 'pipe:0' when streaming.
+    target_bitrate caps the video bitrate (so the output fits the upload limit); H.264 above it is re-encoded.
+    normalize_audio=False copies the audio, for inputs that were already normalized.
+    loudness (a measurement of the input) copies compliant audio and makes the loudnorm two-pass.
+    preset defaults to the encoder policy's choice for the current load (only asked when encoding).
     """
-    Conditionally transcodes video based on codec, and always normalizes audio.
+    # Exact original video bitrate for FFmpeg (stream value, else container value)
+    bitrate = media.bitrate
+    if bitrate_over_target(media, target_bitrate):
+        bitrate = target_bitrate
+    
+    ffmpeg_cmd = [
+        'ffmpeg', '-y', '-i', input_arg,
+        '-map', '0:v?', '-map', '0:a?'  # Ensures both video and optional audio streams are taken
+    ]
+    
+    # Conditional video transcoding
+    if copies_video(media, target_bitrate):
+        # Skip video transcoding, just copy
+        ffmpeg_cmd.extend(['-c:v', 'copy'])
+    else:
+        # Transcode to h264
+        ffmpeg_cmd.extend([
+            '-c:v', 'libx264',
+            '-preset', preset or encoder_policy.choose(),
+            '-profile:v', 'main',
+            '-pix_fmt', 'yuv420p'
+        ])
+        if bitrate:
+            ffmpeg_cmd.extend([
+                '-b:v', str(bitrate),
+                '-maxrate', str(bitrate),
+                '-bufsize', str(int(bitrate) * 2)
+            ])
+        else:
+            ffmpeg_cmd.extend(['-crf', '23'])
+            
+    # Normalize audio unless it already is within the target range
+    ffmpeg_cmd.extend(audio_args(media.audio_codec, loudness, normalize_audio))
+        
+    ffmpeg_cmd.append(str(output_path))
+    return ffmpeg_cmd
+
+
+def bitrate_over_target(media: MediaInfo, target_bitrate: Optional[int]) -> bool:
+    """True if a target bitrate is set and the source's bitrate is above it (or unknown)"""
+    return bool(target_bitrate) and (media.bitrate is None or media.bitrate > target_bitrate)
+
+
+def copies_video(media: MediaInfo, target_bitrate: Optional[int] = None) -> bool:
+    """True if build_ffmpeg_command will copy the video stream instead of encoding it"""
+    return media.codec == 'h264' and not bitrate_over_target(media, target_bitrate)
+
+
+def encodes_video(ffmpeg_cmd: List[str]) -> bool:
+    """True if the command re-encodes the video stream"""
+    return ffmpeg_cmd[ffmpeg_cmd.index('-c:v') + 1] != 'copy'
+
+
+def is_remux(ffmpeg_cmd: List[str]) -> bool:
+    """True if the command copies both video and audio (no encoding at all)"""
+    return not encodes_video(ffmpeg_cmd) and ffmpeg_cmd[ffmpeg_cmd.index('-c:a') + 1] == 'copy'
+
+
+def count_output(encoder: str) -> None:
+    """Count a normalized output by how it was produced (remux, ffmpeg, segmented, bmf), so the remux rate can be watched"""
+    metrics.inc("transcode_outputs_total", encoder=encoder)
+
+
+def annotate_media(media: MediaInfo) -> None:
+    """Record probe results on the running trace span"""
+    annotate(codec=media.codec, audio_codec=media.audio_codec, width=media.width, height=media.height, duration=media.duration)
+
+
+@contextmanager
+def segment_workers() -> Iterator[int]:
+    """
+    Parallel ffmpeg processes a segmented encode may use: the caller's own transcode slot plus
+    the free ones, which are reserved in the scheduler until the block ends so jobs starting
+    meanwhile queue instead of oversubscribing the CPU. Queued jobs are never starved.
+    """
+    extra = transcode_scheduler.reserve_extra(SEGMENT_MAX_WORKERS - 1)
+    try:
+        yield extra + 1
+    finally:
+        transcode_scheduler.release_extra(extra)
+
+
+def transcode_segmented(video_path: Path, media: MediaInfo, output_path: Path, target_bitrate: Optional[int], loudness: Optional[LoudnessInfo], workers: int, preset: str, progress_callback: Optional[Callable[[str], None]] = None) -> None:
+    """
+    Encode video_path into output_path with segment-parallel libx264.
+    The video is split at keyframes and each piece encoded in its own ffmpeg process; the audio
+    is normalized once over the whole track, then everything is concatenated without re-encoding.
+    preset is used for every segment, so they all match; choose it before reserving the workers,
+    or the encoder policy counts the job's own segments as load.
+    """
+    work_dir = video_path.with_name(f"segments_{video_path.stem}")
+    video_only = replace(media, audio_codec=None)
+    
+    def video_cmd(segment: Path, encoded: Path) -> List[str]:
+        return build_ffmpeg_command(str(segment), video_only, encoded, target_bitrate, normalize_audio=False, preset=preset)
+    
+    def audio_cmd(audio_output: Path) -> List[str]:
+        return ['ffmpeg', '-y', '-i', str(video_path), '-map', '0:a:0', '-vn', *audio_args(media.audio_codec, loudness), str(audio_output)]
+    
+    try:
+        transcode_segments(
+            video_path, output_path, work_dir, SEGMENT_SECONDS, workers,
+            video_cmd, audio_cmd if media.has_audio else None, progress_callback
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def report_ffmpeg_progress(line: str, media: MediaInfo, progress_callback: Optional[Callable[[str], None]]) -> None:
+    """Turn an ffmpeg 'time=' status line into a progress message"""
+    duration_sec = media.duration
+    if duration_sec <= 0 or not progress_callback or "time=" not in line:
+        return
+    try:
+        time_str = line.split("time=")[1].split(" ")[0]
+        h, m, s = time_str.split(":")
+        current_sec = int(h) * 3600 + int(m) * 60 + float(s)
+        percent = min(100, int((current_sec / duration_sec) * 100))
+        if percent % 5 == 0:
+            if media.codec == 'h264':
+                progress_callback(f"\u2699\ufe0f [2/2] Normalizando audio... {percent}%")
+            else:
+                progress_callback(f"\u2699\ufe0f [2/2] Transcodificando a H.264... {percent}%")
+    except Exception:
+        pass
+
+
+def run_ffmpeg(ffmpeg_cmd: List[str], media: MediaInfo, progress_callback: Optional[Callable[[str], None]] = None) -> None:
+    """Run an ffmpeg command, reporting its progress; raises if it fails"""
+    with metrics.track("ffmpeg_processes"):
+        process = subprocess.Popen(
+            ffmpeg_cmd, 
+            stdout=subprocess.PIPE, 
+            stderr=subprocess.STDOUT, 
+            text=True,
+            bufsize=1,
+            universal_newlines=True
+        )
+        
+        for line in process.stdout:
+            if DEBUG_MODE:
+                print(line, end="")
+            report_ffmpeg_progress(line, media, progress_callback)
+                    
+        process.wait()
+    result_ffmpeg_code = process.returncode
+    
+    if DEBUG_MODE:
+        if result_ffmpeg_code != 0:
+            print(f"FFmpeg exit code: {result_ffmpeg_code}")
+            
+    if result_ffmpeg_code != 0:
+        raise Exception(f"FFmpeg command failed with code {result_ffmpeg_code}")
+
+
+def transcode_and_normalize(video_path: Path, progress_callback: Optional[Callable[[str], None]] = None, target_bitrate: Optional[int] = None, max_bytes: Optional[int] = None, video_id: Optional[str] = None) -> MediaInfo:
+    """
+    Conditionally transcodes video based on codec, and normalizes audio that is out of range.
     Replaces original file if successful, otherwise keeps original.
+    Returns the media info of the resulting file (derived from the single input probe).
+    With max_bytes, sources too large for it are encoded with single-pass ABR at a bitrate
+    computed from the duration, and an output that still misses gets one lower-bitrate retry.
+    Raises TooLargeError if that bitrate would be below PREFLIGHT_MIN_VIDEO_BITRATE.
+    video_id keys the loudness measurement cache.
+    """
+    with span("probe"):
+        media = probe_media(video_path)
+        annotate_media(media)
+    size = video_path.stat().st_size
+    if max_bytes and size > max_bytes * PREFLIGHT_SIZE_MARGIN:
+        # Same rule as plan_download: too long to fit at a watchable bitrate is a clean rejection
+        sized_bitrate = target_video_bitrate(media.duration, max_bytes)
+        if sized_bitrate is None or sized_bitrate < PREFLIGHT_MIN_VIDEO_BITRATE:
+            raise TooLargeError(size)
+        target_bitrate = min(target_bitrate or sized_bitrate, sized_bitrate)
+    
+    output_media = _normalize(video_path, media, progress_callback, target_bitrate, video_id)
+    if max_bytes:
+        output_media = fit_to_size(video_path, output_media, target_bitrate, max_bytes, progress_callback)
+    return output_media
+
+
+def fit_to_size(video_path: Path, media: MediaInfo, used_bitrate: Optional[int], max_bytes: int, progress_callback: Optional[Callable[[str], None]] = None) -> MediaInfo:
     """
-    codec = detect_video_codec(video_path)
+    Fallback step of the size-targeted encode: if the output is over max_bytes, re-encode its
+    video once at a bitrate scaled down by the overshoot (audio is copied, it's already normalized).
+    Misses are counted in size_target_stats.
+    """
+    size = video_path.stat().st_size
+    size_target_stats.record_check()
+    if size <= max_bytes:
+        return media
+    
+    size_target_stats.record_first_miss()
+    bitrate = fallback_bitrate(used_bitrate or media.bitrate, media.duration, size, max_bytes)
+    if bitrate is None or bitrate < PREFLIGHT_MIN_VIDEO_BITRATE:
+        size_target_stats.record_final_miss()
+        return media
+    
+    print(f"{video_path.name} pesa {size} bytes, recodificando a {bitrate} bps para no superar {max_bytes}")
+    if progress_callback:
+        progress_callback("⚙️ El video supera el límite de Telegram, recodificando a menor calidad...")
+    
+    temp_output = video_path.with_name(f"temp_{video_path.name}")
+    try:
+        # bitrate=None forces a re-encode even though the input is already H.264
+        ffmpeg_cmd = build_ffmpeg_command(str(video_path), replace(media, bitrate=None), temp_output, bitrate, normalize_audio=False)
+        run_ffmpeg(ffmpeg_cmd, media, progress_callback)
+        if temp_output.exists() and temp_output.stat().st_size > 0:
+            video_path.unlink()
+            temp_output.rename(video_path)
+    except Exception as e:
+        print(f"Size-targeted re-encode failed: {e}")
+        if temp_output.exists():
+            temp_output.unlink()
+    
+    if video_path.stat().st_size > max_bytes:
+        size_target_stats.record_final_miss()
+    return media
+
+
+def _normalize(video_path: Path, media: MediaInfo, progress_callback: Optional[Callable[[str], None]], target_bitrate: Optional[int], video_id: Optional[str]) -> MediaInfo:
+    """Single transcode/normalize pass of transcode_and_normalize"""
+    codec = media.codec
     if DEBUG_MODE:
         print(f"Detectado codec: {codec} para {video_path.name}")
         
     temp_output = video_path.with_name(f"temp_{video_path.name}")
+    # The output is always H.264 + AAC with the same dimensions and duration
+    output_media = replace(media, codec='h264', audio_codec='aac' if media.has_audio else None)
     
     try:
-        if codec in ['bvc2', 'bytevc2', 'unknown'] and HAS_BMF:
+        if needs_bmf(codec):
+            annotate(encoder="bmf", source_codec=codec)
             if progress_callback:
                 progress_callback(f"\u2699\ufe0f Codificaci\u00f3n {codec} detectada. Usando BMF...")
             transcode_with_bmf(video_path, temp_output, progress_callback)
@@ -127,130 +385,51 @@ def transcode_and_normalize(video_path: Path, progress_callback: Optional[Callab
             if temp_output.exists() and temp_output.stat().st_size > 0:
                 video_path.unlink()
                 temp_output.rename(video_path)
-            return
+            count_output("bmf")
+            return output_media
             
-        # Get exact original video bitrate using ffprobe for FFmpeg
-        probe_cmd = [
-            'ffprobe', '-v', 'quiet', '-print_format', 'json', 
-            '-show_streams', '-select_streams', 'v:0', str(video_path)
-        ]
-        result = subprocess.run(probe_cmd, capture_output=True, text=True)
-        try:
-            probe_data = json.loads(result.stdout)
-        except json.JSONDecodeError:
-            probe_data = {}
-            
-        bitrate = None
-        if probe_data.get('streams') and len(probe_data['streams']) > 0:
-            bitrate = probe_data['streams'][0].get('bit_rate')
-            
-        if not bitrate:
-            # Fallback to format bitrate
-            probe_cmd_format = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json', 
-                '-show_format', str(video_path)
-            ]
-            result_format = subprocess.run(probe_cmd_format, capture_output=True, text=True)
-            try:
-                probe_data_format = json.loads(result_format.stdout)
-                if probe_data_format.get('format'):
-                    bitrate = probe_data_format['format'].get('bit_rate')
-            except json.JSONDecodeError:
-                pass
-                
-        ffmpeg_cmd = [
-            'ffmpeg', '-y', '-i', str(video_path),
-            '-map', '0:v?', '-map', '0:a?'  # Ensures both video and optional audio streams are taken
-        ]
+        # Measure once (decode only) so compliant audio can be copied and the rest normalized in two passes
+        loudness = measure_loudness(video_path, video_id) if media.has_audio else None
+        ffmpeg_cmd = build_ffmpeg_command(str(video_path), media, temp_output, target_bitrate, loudness=loudness)
+        preset = ffmpeg_cmd[ffmpeg_cmd.index('-preset') + 1] if '-preset' in ffmpeg_cmd else None
+        annotate(
+            encoder="remux" if is_remux(ffmpeg_cmd) else "ffmpeg",
+            source_codec=codec,
+            preset=preset,
+            target_bitrate=target_bitrate,
+            audio=ffmpeg_cmd[ffmpeg_cmd.index('-c:a') + 1] if '-c:a' in ffmpeg_cmd else None,
+        )
         
-        # Conditional video transcoding
-        if codec == 'h264':
-            # Skip video transcoding, just copy
-            ffmpeg_cmd.extend(['-c:v', 'copy'])
-        else:
-            # Transcode to h264
-            ffmpeg_cmd.extend([
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-profile:v', 'main',
-                '-pix_fmt', 'yuv420p'
-            ])
-            if bitrate:
-                ffmpeg_cmd.extend([
-                    '-b:v', str(bitrate),
-                    '-maxrate', str(bitrate),
-                    '-bufsize', str(int(bitrate) * 2)
-                ])
-            else:
-                ffmpeg_cmd.extend(['-crf', '23'])
-                
-        # Always normalize audio
-        ffmpeg_cmd.extend([
-            '-c:a', 'aac',
-            '-af', 'loudnorm=I=-16:LRA=11:TP=-1.5'
-        ])
-            
-        ffmpeg_cmd.append(str(temp_output))
-        
-        # Determine duration to calculate progress
-        duration_sec = 0
-        if probe_data.get('streams') and len(probe_data['streams']) > 0:
-            duration_str = probe_data['streams'][0].get('duration')
-            if duration_str:
-                try:
-                    duration_sec = float(duration_str)
-                except ValueError:
-                    pass
+        # Long encodes are split across idle cores, with the preset chosen above (before the workers are reserved)
+        if encodes_video(ffmpeg_cmd) and media.duration >= SEGMENT_MIN_DURATION:
+            with segment_workers() as workers:
+                if workers > 1:
+                    try:
+                        transcode_segmented(video_path, media, temp_output, target_bitrate, loudness, workers, preset, progress_callback)
+                        annotate(encoder="segmented", workers=workers)
+                        video_path.unlink()
+                        temp_output.rename(video_path)
+                        count_output("segmented")
+                        return output_media
+                    except Exception as e:
+                        print(f"Segmented transcode failed, using a single ffmpeg process: {e}")
         
         if progress_callback:
-            if codec == 'h264':
+            if is_remux(ffmpeg_cmd):
+                progress_callback("\u2699\ufe0f [2/2] Empaquetando video (audio ya normalizado)...")
+            elif codec == 'h264':
                 progress_callback("\u2699\ufe0f [2/2] Normalizando audio (Video H.264 listo)... 0%")
             else:
                 progress_callback("\u2699\ufe0f [2/2] Transcodificando a H.264... 0%")
-            
-        process = subprocess.Popen(
-            ffmpeg_cmd, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.STDOUT, 
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-        
-        stderr_output = []
-        for line in process.stdout:
-            stderr_output.append(line)
-            if DEBUG_MODE:
-                print(line, end="")
-            
-            if duration_sec > 0 and progress_callback and "time=" in line:
-                try:
-                    time_str = line.split("time=")[1].split(" ")[0]
-                    h, m, s = time_str.split(":")
-                    current_sec = int(h) * 3600 + int(m) * 60 + float(s)
-                    percent = min(100, int((current_sec / duration_sec) * 100))
-                    if percent % 5 == 0:
-                        if codec == 'h264':
-                            progress_callback(f"\u2699\ufe0f [2/2] Normalizando audio... {percent}%")
-                        else:
-                            progress_callback(f"\u2699\ufe0f [2/2] Transcodificando a H.264... {percent}%")
-                except Exception:
-                    pass
-                    
-        process.wait()
-        result_ffmpeg_code = process.returncode
         
-        if DEBUG_MODE:
-            if result_ffmpeg_code != 0:
-                print(f"FFmpeg exit code: {result_ffmpeg_code}")
-                
-        if result_ffmpeg_code != 0:
-            raise Exception(f"FFmpeg command failed with code {result_ffmpeg_code}")
+        run_ffmpeg(ffmpeg_cmd, media, progress_callback)
         
         # Replace original file with transcoded one
         if temp_output.exists() and temp_output.stat().st_size > 0:
             video_path.unlink()
             temp_output.rename(video_path)
+        count_output("remux" if is_remux(ffmpeg_cmd) else "ffmpeg")
+        return output_media
     except Exception as e:
         print(f"Transcoding error: {e}")
         if temp_output.exists():
@@ -270,174 +449,437 @@ def extract_video_id(url: str) -> Optional[str]:
     return None
 
 
-def get_tiktok_info(url: str, hd: int = 1) -> Optional[dict]:
+def resolve_video_id(url: str) -> Optional[str]:
+    """Video id of url without any network call: from the URL itself or a short link seen before"""
+    return extract_video_id(url) or metadata_cache.resolve(url)
+
+
+async def get_tiktok_info_async(url: str, hd: int = 1) -> Optional[dict]:
     """
-    Get TikTok video info using tikwm.com API
+    Get TikTok video info from the metadata providers (tikwm.com API first)
     Returns video data including download URLs
+    Responses are cached for a few minutes (never past the expiry of their CDN URLs).
     """
-    api_url = "https://www.tikwm.com/api/"
+    video_id = resolve_video_id(url)
+    if video_id:
+        cached = metadata_cache.get(video_id, hd)
+        if cached is not None:
+            return cached
     
-    try:
-        response = requests.post(
-            api_url,
-            data={"url": url, "hd": hd},
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "Accept": "application/json",
-            },
-            timeout=30
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get("code") == 0 and data.get("data"):
-            if DEBUG_MODE:
-                print("=== TIKWM API RESPONSE ===")
-                print(json.dumps(data["data"], indent=2, ensure_ascii=True))
-            return data["data"]
-        else:
-            return None
-            
-    except Exception as e:
-        print(f"Error getting TikTok info: {e}")
-        return None
+    with span("metadata_fetch", hd=hd):
+        info = await metadata_chain.fetch(url, hd)
+    if info is not None:
+        metadata_cache.put(url, hd, info)
+    else:
+        metrics.error("metadata_fetch")
+    return info
 
 
-def download_file(url: str, filepath: Path, progress_callback: Optional[Callable[[str], None]] = None) -> bool:
+async def count_downloaded(chunks):
+    """Pass chunks through, adding their size to the downloaded bytes counter and the running span"""
+    async for chunk in chunks:
+        metrics.inc("downloaded_bytes_total", len(chunk))
+        accumulate("bytes", len(chunk))
+        yield chunk
+
+
+async def download_file_async(url: str, filepath: Path, progress_callback: Optional[Callable[[str], None]] = None) -> bool:
     """Download a file from URL to filepath"""
     try:
-        response = requests.get(
-            url,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            },
-            timeout=120,
-            stream=True
-        )
-        response.raise_for_status()
-        # Get total file size if available
-        total_size = int(response.headers.get('content-length', 0))
-        downloaded = 0
-        last_percent = 0
-        
-        if progress_callback:
-            progress_callback(f"⏳ [1/2] Obteniendo medios de TikTok... 0%")
+        async with http_session.stream("GET", url, timeout=120) as response:
+            response.raise_for_status()
+            # Get total file size if available
+            total_size = int(response.headers.get('content-length', 0))
+            downloaded = 0
+            last_percent = 0
             
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if total_size > 0 and progress_callback:
-                        percent = int((downloaded / total_size) * 100)
-                        # Report only every 10% to prevent telegram floor
-                        if percent >= last_percent + 10:
-                            last_percent = percent
-                            progress_callback(f"⏳ [1/2] Descargando de Servidores... {percent}%")
-                            
+            if progress_callback:
+                progress_callback(f"⏳ [1/2] Obteniendo medios de TikTok... 0%")
+                
+            with open(filepath, 'wb') as f:
+                async for chunk in count_downloaded(response.aiter_bytes(chunk_size=65536)):
+                    if chunk:
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        if total_size > 0 and progress_callback:
+                            percent = int((downloaded / total_size) * 100)
+                            # Report only every 10% to prevent telegram floor
+                            if percent >= last_percent + 10:
+                                last_percent = percent
+                                progress_callback(f"⏳ [1/2] Descargando de Servidores... {percent}%")
+                                
         return True
     except Exception as e:
         print(f"Error downloading file: {e}")
+        metrics.error("download")
         return False
 
 
-def download_video(url: str, progress_callback: Optional[Callable[[str], None]] = None) -> DownloadResult:
+def get_music_id(info: dict) -> str:
+    """Id of the sound used by a TikTok ('' if tikwm didn't send one)"""
+    music_info = info.get("music_info") or {}
+    return str(music_info.get("id") or "")
+
+
+async def fetch_music(info: dict, audio_path: Path, progress_callback: Optional[Callable[[str], None]] = None) -> bool:
     """
-    Download TikTok video at best quality.
-    Returns DownloadResult with file paths.
+    Get the TikTok's sound into audio_path.
+    Trending sounds are shared by thousands of videos, so they are cached by music id.
     """
-    clean_downloads()
+    music_url = info.get("music")
+    if not music_url:
+        return False
+    
+    music_id = get_music_id(info)
+    if music_id and await asyncio.to_thread(audio_cache.fetch, music_id, audio_path):
+        return True
     
+    if not await download_file_async(music_url, audio_path, progress_callback):
+        return False
+    if music_id:
+        await asyncio.to_thread(audio_cache.put, music_id, audio_path)
+    return True
+
+
+def _fetch_cached_result(video_id: str, video_path: Path) -> Optional[int]:
+    """Copy a cached output into the workspace; returns its quality tier (1=HD, 0=SD) or None"""
+    for hd in (1, 0):
+        if result_cache.fetch(result_key(video_id, hd, TRANSCODE_PROFILE), video_path):
+            return hd
+    return None
+
+
+@contextmanager
+def stage_timer(timings: Dict[str, float], stage: str, expected: Tuple[type, ...] = ()) -> Iterator[None]:
+    """Add the seconds spent in the block to timings[stage] (and trace it as a span, see span() for expected)"""
+    start = time.perf_counter()
     try:
-        # Get video info from API
-        info = get_tiktok_info(url)
-        
-        if info is None:
-            return DownloadResult(
-                success=False,
-                content_type='video',
-                files=[],
-                error="No se pudo obtener información del video. Verifica que el link sea válido y público."
-            )
-        
-        title = info.get("title", "TikTok Video")[:100]  # Limit title length
-        author = info.get("author", {}).get("unique_id", "unknown")
-        video_id = info.get("id", "video")
-        
-        # Check if it's a slideshow (images)
-        images = info.get("images")
-        if images and len(images) > 0:
-            return download_slideshow_from_info(info, title, author)
-        
-        # Get video URL (prefer HD)
-        video_url = info.get("hdplay") or info.get("play")
+        with span(stage, expected):
+            yield
+    finally:
+        timings[stage] = round(timings.get(stage, 0.0) + time.perf_counter() - start, 3)
+
+
+async def transcode_in_slot(video_path: Path, progress_callback: Optional[Callable[[str], None]] = None, target_bitrate: Optional[int] = None, max_bytes: Optional[int] = None, video_id: Optional[str] = None) -> MediaInfo:
+    """
+    Wait for a transcode slot on the event loop, then run ffmpeg/BMF in a worker thread.
+    Threads are only held while a transcode is actually running.
+    """
+    async with transcode_scheduler.slot_async(progress_callback):
+        return await asyncio.to_thread(transcode_and_normalize, video_path, progress_callback, target_bitrate, max_bytes, video_id)
+
+
+async def stream_transcode(url: str, video_path: Path, progress_callback: Optional[Callable[[str], None]] = None, target_bitrate: Optional[int] = None, max_bytes: Optional[int] = None, video_id: Optional[str] = None) -> Optional[MediaInfo]:
+    """
+    Pipe the CDN download straight into ffmpeg's stdin so transcoding overlaps the download
+    and the raw file never touches the disk.
+    Needs a faststart MP4, a codec ffmpeg handles and a free transcode slot. H.264 sources whose
+    video will be copied also need a loudness measurement from an earlier run: a pipe can't be
+    analyzed ahead of time, and without one the audio would always be re-encoded, turning a
+    remux into an encode. Encodes of SEGMENT_MIN_DURATION or longer are left to the segmented
+    encoder, which needs the file. Otherwise the stream is written to video_path as usual and None is
+    returned so the caller transcodes it (measuring the landed file).
+    Raises if the download or ffmpeg fails midway.
+    """
+    async with http_session.stream("GET", url, timeout=120) as response:
+        response.raise_for_status()
+        chunks = count_downloaded(response.aiter_bytes(chunk_size=65536))
         
-        if not video_url:
-            return DownloadResult(
-                success=False,
-                content_type='video',
-                files=[],
-                error="No se encontró URL de descarga del video"
-            )
+        # Buffer the beginning of the file to find out what we are dealing with
+        head = bytearray()
+        async for chunk in chunks:
+            head.extend(chunk)
+            if len(head) >= STREAM_PROBE_BYTES:
+                break
+        with span("probe", streamed=True):
+            media = await asyncio.to_thread(probe_bytes, bytes(head))
+            annotate_media(media)
         
-        # Download video
-        video_path = DOWNLOAD_DIR / f"{video_id}.mp4"
-        files = []
+        loudness = cached_loudness(video_id) if video_id else None
+        streamable = media.codec != 'unknown' and not needs_bmf(media.codec)
+        # A copied video with unmeasured audio is cheaper as measure + remux from disk,
+        # and long encodes are faster split across cores, which needs the file
+        unmeasured_remux = copies_video(media, target_bitrate) and media.has_audio and loudness is None
+        long_encode = not copies_video(media, target_bitrate) and media.duration >= SEGMENT_MIN_DURATION
+        if not streamable or unmeasured_remux or long_encode or not transcode_scheduler.try_acquire():
+            # Not streamable (or better from disk, or no free slot): finish the download to disk
+            with open(video_path, 'wb') as f:
+                f.write(head)
+                async for chunk in chunks:
+                    f.write(chunk)
+            return None
         
-        if download_file(video_url, video_path, progress_callback):
-            print(f"Video downloaded, starting transcoding & normalization for {video_path.name}")
+        try:
+            if progress_callback:
+                progress_callback("\u2699\ufe0f [1/2] Descargando y transcodificando en paralelo... 0%")
+            await _pipe_into_ffmpeg(bytes(head), chunks, media, video_path, progress_callback, target_bitrate, loudness)
+            output_media = replace(media, codec='h264', audio_codec='aac' if media.has_audio else None)
+            if max_bytes:
+                # Still holding the slot, in case the output needs the fallback re-encode
+                output_media = await asyncio.to_thread(fit_to_size, video_path, output_media, target_bitrate, max_bytes, progress_callback)
+        finally:
+            transcode_scheduler.release()
+    
+    print(f"Streaming transcode completado para {video_path.name} ({media.codec})")
+    return output_media
+
+
+async def _pipe_into_ffmpeg(head: bytes, chunks, media: MediaInfo, output_path: Path, progress_callback: Optional[Callable[[str], None]], target_bitrate: Optional[int] = None, loudness: Optional[LoudnessInfo] = None) -> None:
+    """Feed head + remaining chunks to an ffmpeg reading from stdin, writing output_path"""
+    ffmpeg_cmd = build_ffmpeg_command('pipe:0', media, output_path, target_bitrate, loudness=loudness)
+    with metrics.track("ffmpeg_processes"):
+        process = await asyncio.create_subprocess_exec(
+            *ffmpeg_cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+    
+        async def read_progress():
+            # ffmpeg separates status updates with \r, so split on both line endings
+            buffer = b''
+            while True:
+                data = await process.stderr.read(4096)
+                if not data:
+                    break
+                buffer += data
+                *lines, buffer = re.split(rb'[\r\n]', buffer)
+                for line in lines:
+                    text = line.decode(errors='replace')
+                    if DEBUG_MODE and text:
+                        print(text)
+                    report_ffmpeg_progress(text, media, progress_callback)
+    
+        reader = asyncio.create_task(read_progress())
+        try:
+            try:
+                process.stdin.write(head)
+                await process.stdin.drain()
+                async for chunk in chunks:
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()  # Backpressure: download no faster than ffmpeg reads
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg exited early, its return code says why
+            finally:
+                process.stdin.close()
+            await process.wait()
+            await reader
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            reader.cancel()
+            if output_path.exists():
+                output_path.unlink()
+            raise
+    
+        if process.returncode != 0:
+            if output_path.exists():
+                output_path.unlink()
+            raise Exception(f"FFmpeg (streaming) failed with code {process.returncode}")
+    count_output("remux" if is_remux(ffmpeg_cmd) else "ffmpeg")
+
+
+async def download_video_async(url: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None, info: Optional[dict] = None) -> DownloadResult:
+    """
+    Download TikTok video at best quality into job_dir.
+    If job_dir is not given a new workspace is created and returned in result.workspace.
+    info can be passed when the caller already fetched it with get_tiktok_info.
+    Returns DownloadResult with file paths.
+    """
+    if job_dir is None:
+        job_dir = create_workspace()
+    with track_connections() as connections:
+        result = await _download_video(url, job_dir, progress_callback, info)
+    result.workspace = str(job_dir)
+    result.connections = connections.count
+    print(f"Conexiones HTTP nuevas para {result.video_id or url}: {connections.count}")
+    return result
+
+
+async def _download_video(url: str, job_dir: Path, progress_callback: Optional[Callable[[str], None]] = None, info: Optional[dict] = None) -> DownloadResult:
+    """
+    Video download pipeline, writing only inside job_dir.
+    The audio track is fetched in the background while the video downloads and transcodes.
+    """
+    timings: Dict[str, float] = {}
+    audio_task = None
+    try:
+        with stage_timer(timings, "total", REJECTIONS):
+            # Get video info from API
+            if info is None:
+                with stage_timer(timings, "lookup"):
+                    info = await get_tiktok_info_async(url)
+            
+            if info is None:
+                return DownloadResult(
+                    success=False,
+                    content_type='video',
+                    files=[],
+                    error="No se pudo obtener información del video. Verifica que el link sea válido y público."
+                )
+            
+            title = info.get("title", "TikTok Video")[:100]  # Limit title length
+            author = info.get("author", {}).get("unique_id", "unknown")
+            video_id = info.get("id", "video")
+            
+            # Check if it's a slideshow (images)
+            images = info.get("images")
+            if images and len(images) > 0:
+                return await download_slideshow_from_info_async(info, title, author, job_dir=job_dir)
+            
+            # Get video URL (prefer HD)
+            video_url = info.get("hdplay") or info.get("play")
+            
+            if not video_url:
+                return DownloadResult(
+                    success=False,
+                    content_type='video',
+                    files=[],
+                    error="No se encontró URL de descarga del video"
+                )
+            
+            # Start the audio download now so it overlaps the video download and transcode
+            audio_path = job_dir / f"{video_id}_audio.mp3"
+            if info.get("music"):
+                async def fetch_audio() -> bool:
+                    with stage_timer(timings, "audio_download"):
+                        return await fetch_music(info, audio_path)
+                audio_task = asyncio.create_task(fetch_audio())
+            
+            # Download video
+            video_path = job_dir / f"{video_id}.mp4"
+            files = []
+            
+            # A finished output for this id (HD first, then SD) skips download and transcode entirely
+            with stage_timer(timings, "result_cache"):
+                cached_tier = await asyncio.to_thread(_fetch_cached_result, str(video_id), video_path)
+            if cached_tier is None:
+                # Pick the tier (and bitrate) that can actually be sent before downloading anything
+                with stage_timer(timings, "preflight"):
+                    try:
+                        plan = await plan_download(info)
+                    except TooLargeError as e:
+                        return DownloadResult(
+                            success=False,
+                            content_type='video',
+                            files=[],
+                            error=str(e)
+                        )
+                video_url = plan.url
+                if plan.target_bitrate:
+                    print(f"Preflight: {video_id} pesa {plan.size} bytes, se recodifica a {plan.target_bitrate} bps (hd={plan.tier})")
+            if cached_tier is not None:
+                print(f"Result cache hit para {video_id} (hd={cached_tier})")
+                with span("probe"):
+                    media = await asyncio.to_thread(probe_media, video_path)
+                    annotate_media(media)
+                files.append(str(video_path))
+                if audio_task is not None and await audio_task:
+                    files.append(str(audio_path))
+                return DownloadResult(
+                    success=True,
+                    content_type='video',
+                    files=files,
+                    title=title,
+                    author=author,
+                    video_id=str(video_id),
+                    music_id=get_music_id(info),
+                    media=media,
+                    timings=timings
+                )
+            
+            # Only now is a transcode certain: reject before downloading a video we have no capacity for
+            if transcode_scheduler.is_full():
+                raise QueueFullError()
+            
+            # Streaming mode transcodes while downloading; media stays None if it fell back to a plain download
+            media = None
+            # Quality tier of a successfully normalized output, published to the result cache
+            normalized_tier = None
+            if STREAM_TRANSCODE:
+                with stage_timer(timings, "download_transcode"):
+                    try:
+                        media = await stream_transcode(video_url, video_path, progress_callback, plan.target_bitrate, TELEGRAM_MAX_UPLOAD, str(video_id))
+                        downloaded = True
+                    except Exception as e:
+                        print(f"Streaming transcode failed, retrying as regular download: {e}")
+                        metrics.error("download_transcode")
+                        downloaded = await download_file_async(video_url, video_path, progress_callback)
+            else:
+                with stage_timer(timings, "download"):
+                    downloaded = await download_file_async(video_url, video_path, progress_callback)
+            
+            if not downloaded:
+                return DownloadResult(
+                    success=False,
+                    content_type='video',
+                    files=[],
+                    error="Error al descargar el video"
+                )
             
             try:
-                transcode_and_normalize(video_path, progress_callback)
+                if media is None:
+                    print(f"Video downloaded, starting transcoding & normalization for {video_path.name}")
+                    # Wait for a free transcode slot (bounded by CPU cores)
+                    with stage_timer(timings, "transcode", REJECTIONS):
+                        media = await transcode_in_slot(video_path, progress_callback, plan.target_bitrate, TELEGRAM_MAX_UPLOAD, str(video_id))
+                normalized_tier = plan.tier
+            except REJECTIONS:
+                raise
             except Exception as e:
+                # Already counted in errors_total by the stage timer
                 print(f"Transcoding failed completely: {e}")
                 # Fallback to hd=0 if transcoding failed
                 if "No se encontr\u00f3 URL de descarga" not in str(e):
                     if progress_callback:
                         progress_callback("\u26a0\ufe0f Codificaci\u00f3n no soportada/Fallo de memoria. Reintentando con calidad est\u00e1ndar...")
                     
-                    # Try again with hd=0
-                    info_sd = get_tiktok_info(url, hd=0)
-                    if info_sd:
-                        video_url_sd = info_sd.get("play")
-                        if video_url_sd:
-                            # Remove the bad HD file before downloading SD
-                            if video_path.exists():
-                                try:
-                                    video_path.unlink()
-                                except Exception:
-                                    pass
-                                    
-                            if download_file(video_url_sd, video_path, progress_callback):
-                                # Try standard transcoding one more time
-                                try:
-                                    transcode_and_normalize(video_path, progress_callback)
-                                except Exception:
-                                    pass # Just keep whatever we got if it still fails
+                    with stage_timer(timings, "fallback"):
+                        annotate(hd=0)
+                        # Try again with hd=0
+                        info_sd = await get_tiktok_info_async(url, hd=0)
+                        if info_sd:
+                            video_url_sd = info_sd.get("play")
+                            if video_url_sd:
+                                # Remove the bad HD file before downloading SD
+                                if video_path.exists():
+                                    try:
+                                        video_path.unlink()
+                                    except Exception:
+                                        pass
+                                        
+                                if await download_file_async(video_url_sd, video_path, progress_callback):
+                                    # Try standard transcoding one more time
+                                    try:
+                                        media = await transcode_in_slot(video_path, progress_callback, plan.target_bitrate, TELEGRAM_MAX_UPLOAD, str(video_id))
+                                        normalized_tier = 0
+                                    except Exception:
+                                        pass # Just keep whatever we got if it still fails
             
             files.append(str(video_path))
+            if normalized_tier is not None:
+                await asyncio.to_thread(result_cache.put, result_key(str(video_id), normalized_tier, TRANSCODE_PROFILE), video_path)
             
-            # Also download audio by default
-            music_url = info.get("music")
-            if music_url:
-                audio_path = DOWNLOAD_DIR / f"{video_id}_audio.mp3"
-                if download_file(music_url, audio_path):
+            # Audio is downloaded by default; usually finished by now
+            if audio_task is not None:
+                with stage_timer(timings, "audio_wait"):
+                    audio_ok = await audio_task
+                if audio_ok:
                     files.append(str(audio_path))
-            
-            return DownloadResult(
-                success=True,
-                content_type='video',
-                files=files,
-                title=title,
-                author=author
-            )
-        else:
-            return DownloadResult(
-                success=False,
-                content_type='video',
-                files=[],
-                error="Error al descargar el video"
-            )
+        
+        print(f"Tiempos por etapa para {video_id}: {timings}")
+        return DownloadResult(
+            success=True,
+            content_type='video',
+            files=files,
+            title=title,
+            author=author,
+            video_id=str(video_id),
+            music_id=get_music_id(info),
+            media=media,
+            timings=timings
+        )
             
     except Exception as e:
         return DownloadResult(
@@ -446,31 +888,60 @@ def download_video(url: str, progress_callback: Optional[Callable[[str], None]]
             files=[],
             error=str(e)
         )
+    finally:
+        # Never leave the background audio download running after an early exit
+        if audio_task is not None and not audio_task.done():
+            audio_task.cancel()
 
 
-def download_slideshow_from_info(info: dict, title: str, author: str, progress_callback: Optional[Callable[[str], None]] = None) -> DownloadResult:
+async def download_slideshow_from_info_async(info: dict, title: str, author: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None) -> DownloadResult:
     """
     Download TikTok slideshow (images) and audio from API info.
     """
+    if job_dir is None:
+        job_dir = create_workspace()
+        
     try:
         images = info.get("images", [])
         video_id = info.get("id", "slideshow")
-        files = []
         
-        # Download each image
-        for i, img_url in enumerate(images):
-            if progress_callback:
-                progress_callback(f"⏳ Cosechando Imagen {i+1} de {len(images)}...")
-            img_path = DOWNLOAD_DIR / f"{video_id}_{i+1}.jpg"
-            if download_file(img_url, img_path):
-                files.append(str(img_path))
+        # Images first (in slideshow order), then the audio track
+        targets: List[Tuple[Callable[[Path], Awaitable[bool]], Path]] = [
+            (lambda path, img_url=img_url: download_file_async(img_url, path), job_dir / f"{video_id}_{i+1}.jpg")
+            for i, img_url in enumerate(images)
+        ]
+        if info.get("music"):
+            targets.append((lambda path: fetch_music(info, path), job_dir / f"{video_id}_audio.mp3"))
         
-        # Download audio if available
-        music_url = info.get("music")
-        if music_url:
-            audio_path = DOWNLOAD_DIR / f"{video_id}_audio.mp3"
-            if download_file(music_url, audio_path):
-                files.append(str(audio_path))
+        # Fetch everything concurrently, at most SLIDESHOW_CONCURRENCY transfers per job
+        semaphore = asyncio.Semaphore(SLIDESHOW_CONCURRENCY)
+        done = [0]
+        
+        async def fetch(fetcher: Callable[[Path], Awaitable[bool]], path: Path) -> Tuple[bool, float]:
+            """Fetch one file, returning whether it worked and the seconds it took"""
+            async with semaphore:
+                start = time.perf_counter()
+                ok = await fetcher(path)
+                elapsed = time.perf_counter() - start
+            done[0] += 1
+            if progress_callback and images:
+                progress_callback(f"⏳ Cosechando Imagen {min(done[0], len(images))} de {len(images)}...")
+            return ok, elapsed
+        
+        wall_start = time.perf_counter()
+        # A failed image only drops that image, never the whole slideshow
+        with span("slideshow_download", files=len(targets)):
+            results = await asyncio.gather(*(fetch(f, p) for f, p in targets), return_exceptions=True)
+        wall_time = time.perf_counter() - wall_start
+        
+        outcomes = [(False, 0.0) if isinstance(r, BaseException) else r for r in results]
+        files = [str(path) for (_, path), (ok, _) in zip(targets, outcomes) if ok]
+        serial_time = sum(elapsed for _, elapsed in outcomes)
+        timings = {"slideshow_serial": round(serial_time, 3), "slideshow_wall": round(wall_time, 3)}
+        print(
+            f"Slideshow {video_id}: {len(files)}/{len(targets)} archivos, "
+            f"serie {serial_time:.2f}s vs paralelo {wall_time:.2f}s"
+        )
         
         if files:
             return DownloadResult(
@@ -478,14 +949,19 @@ def download_slideshow_from_info(info: dict, title: str, author: str, progress_c
                 content_type='slideshow',
                 files=files,
                 title=title,
-                author=author
+                author=author,
+                workspace=str(job_dir),
+                video_id=str(video_id),
+                music_id=get_music_id(info),
+                timings=timings
             )
         else:
             return DownloadResult(
                 success=False,
                 content_type='slideshow',
                 files=[],
-                error="No se pudieron descargar las imágenes"
+                error="No se pudieron descargar las imágenes",
+                workspace=str(job_dir)
             )
             
     except Exception as e:
@@ -493,39 +969,52 @@ def download_slideshow_from_info(info: dict, title: str, author: str, progress_c
             success=False,
             content_type='slideshow',
             files=[],
-            error=str(e)
+            error=str(e),
+            workspace=str(job_dir)
         )
 
 
-def download_slideshow(url: str, progress_callback: Optional[Callable[[str], None]] = None) -> DownloadResult:
+async def download_slideshow_async(url: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None) -> DownloadResult:
     """
     Download TikTok slideshow (images) and audio.
     """
-    clean_downloads()
-    
-    info = get_tiktok_info(url)
-    if info is None:
-        return DownloadResult(
-            success=False,
-            content_type='slideshow',
-            files=[],
-            error="No se pudo obtener información del slideshow"
-        )
-    
-    title = info.get("title", "TikTok Slideshow")[:100]
-    author = info.get("author", {}).get("unique_id", "unknown")
-    return download_slideshow_from_info(info, title, author, progress_callback)
+    with track_connections() as connections:
+        info = await get_tiktok_info_async(url)
+        if info is None:
+            return DownloadResult(
+                success=False,
+                content_type='slideshow',
+                files=[],
+                error="No se pudo obtener información del slideshow"
+            )
+        
+        title = info.get("title", "TikTok Slideshow")[:100]
+        author = info.get("author", {}).get("unique_id", "unknown")
+        result = await download_slideshow_from_info_async(info, title, author, progress_callback, job_dir)
+    result.connections = connections.count
+    return result
 
 
-def download_audio(url: str, progress_callback: Optional[Callable[[str], None]] = None) -> DownloadResult:
+async def download_audio_async(url: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None, info: Optional[dict] = None) -> DownloadResult:
     """
-    Extract and download audio from TikTok video.
+    Extract and download audio from TikTok video into job_dir.
+    info can be passed when the caller already fetched it with get_tiktok_info.
     Returns DownloadResult with audio file path.
     """
-    clean_downloads()
-    
+    if job_dir is None:
+        job_dir = create_workspace()
+    with track_connections() as connections:
+        result = await _download_audio(url, job_dir, progress_callback, info)
+    result.workspace = str(job_dir)
+    result.connections = connections.count
+    return result
+
+
+async def _download_audio(url: str, job_dir: Path, progress_callback: Optional[Callable[[str], None]] = None, info: Optional[dict] = None) -> DownloadResult:
+    """Audio download pipeline, writing only inside job_dir"""
     try:
-        info = get_tiktok_info(url)
+        if info is None:
+            info = await get_tiktok_info_async(url)
         
         if info is None:
             return DownloadResult(
@@ -553,15 +1042,17 @@ def download_audio(url: str, progress_callback: Optional[Callable[[str], None]]
             )
         
         # Download audio
-        audio_path = DOWNLOAD_DIR / f"{video_id}_audio.mp3"
+        audio_path = job_dir / f"{video_id}_audio.mp3"
         
-        if download_file(music_url, audio_path, progress_callback):
+        if await fetch_music(info, audio_path, progress_callback):
             return DownloadResult(
                 success=True,
                 content_type='audio',
                 files=[str(audio_path)],
                 title=music_title,
-                author=author
+                author=author,
+                video_id=str(video_id),
+                music_id=get_music_id(info)
             )
         else:
             return DownloadResult(
@@ -580,12 +1071,50 @@ def download_audio(url: str, progress_callback: Optional[Callable[[str], None]]
         )
 
 
-def download_all(url: str, progress_callback: Optional[Callable[[str], None]] = None) -> DownloadResult:
+async def download_all_async(url: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None) -> DownloadResult:
     """
     Download video/slideshow and audio from TikTok.
     Automatically detects content type and downloads appropriately.
     """
-    return download_video(url, progress_callback)
+    return await download_video_async(url, progress_callback, job_dir)
+
+
+# Synchronous API for scripts and threads without an event loop.
+# Each call runs the async pipeline on a private loop.
+
+def get_tiktok_info(url: str, hd: int = 1) -> Optional[dict]:
+    """Blocking version of get_tiktok_info_async"""
+    return run_sync(get_tiktok_info_async(url, hd))
+
+
+def download_file(url: str, filepath: Path, progress_callback: Optional[Callable[[str], None]] = None) -> bool:
+    """Blocking version of download_file_async"""
+    return run_sync(download_file_async(url, filepath, progress_callback))
+
+
+def download_video(url: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None, info: Optional[dict] = None) -> DownloadResult:
+    """Blocking version of download_video_async"""
+    return run_sync(download_video_async(url, progress_callback, job_dir, info))
+
+
+def download_slideshow_from_info(info: dict, title: str, author: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None) -> DownloadResult:
+    """Blocking version of download_slideshow_from_info_async"""
+    return run_sync(download_slideshow_from_info_async(info, title, author, progress_callback, job_dir))
+
+
+def download_slideshow(url: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None) -> DownloadResult:
+    """Blocking version of download_slideshow_async"""
+    return run_sync(download_slideshow_async(url, progress_callback, job_dir))
+
+
+def download_audio(url: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None, info: Optional[dict] = None) -> DownloadResult:
+    """Blocking version of download_audio_async"""
+    return run_sync(download_audio_async(url, progress_callback, job_dir, info))
+
+
+def download_all(url: str, progress_callback: Optional[Callable[[str], None]] = None, job_dir: Optional[Path] = None) -> DownloadResult:
+    """Blocking version of download_all_async"""
+    return run_sync(download_all_async(url, progress_callback, job_dir))
 
 
 if __name__ == "__main__":
@@ -611,4 +1140,4 @@ if __name__ == "__main__":
         if DEBUG_MODE:
             print(f"Archivo guardado localmente en la carpeta 'downloads' para inspección.")
         else:
-            clean_downloads()
+            remove_workspace(Path(result.workspace) if result.workspace else None)
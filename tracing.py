@@ -0,0 +1,166 @@
+# Tracing Module
+# Lightweight per-job tracing: every pipeline stage records a span (start/end
+# relative to the job, plus attributes such as bytes or codec), and each job
+# logs a single JSON line with its whole timeline. A sample of jobs also runs
+# under cProfile; the profile is kept only when the job turns out to be slow.
+
+import cProfile
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import TRACE_ENABLED, TRACE_SLOW_JOB_SECONDS, TRACE_PROFILE_SAMPLE_RATE, TRACE_PROFILE_DIR, TRACE_PROFILE_KEEP
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    start: float  # Seconds since the job started
+    end: Optional[float] = None
+    attrs: Dict[str, object] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        span = {"name": self.name, "start": round(self.start, 3), "end": round(self.end, 3) if self.end is not None else None}
+        span.update(self.attrs)
+        return span
+
+
+class Trace:
+    """Spans of one job; spans may be recorded from the job's tasks and worker threads"""
+
+    def __init__(self, job: str, **attrs):
+        self.job = job
+        self.attrs: Dict[str, object] = dict(attrs)
+        self.spans: List[Span] = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return {
+            "job": self.job,
+            **self.attrs,
+            "duration": round(self.elapsed(), 3),
+            "spans": [s.to_dict() for s in spans],
+        }
+
+
+# Job and innermost span of the running task (inherited by the tasks and threads it starts)
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+# cProfile can't run twice at once in one process
+_profiling = threading.Lock()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, expected: Tuple[type, ...] = (), **attrs) -> Iterator[Span]:
+    """
+    Time a stage: observed in the metrics histogram under name and, inside a job,
+    recorded as a span of its trace. Attributes can be added while it runs with annotate().
+    Exceptions of the expected types aren't counted as errors of the stage.
+    """
+    trace = _current_trace.get()
+    current = Span(name, trace.elapsed() if trace else 0.0, attrs=dict(attrs))
+    token = _current_span.set(current)
+    try:
+        with metrics.timer(name, expected):
+            yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        if trace is not None:
+            current.end = trace.elapsed()
+            trace.add(current)
+
+
+def annotate(**attrs) -> None:
+    """Add attributes to the innermost running span (no-op outside one)"""
+    current = _current_span.get()
+    if current is not None:
+        current.attrs.update((k, v) for k, v in attrs.items() if v is not None)
+
+
+def accumulate(key: str, amount: float) -> None:
+    """Add amount to a counter attribute of the innermost running span (e.g. bytes transferred)"""
+    current = _current_span.get()
+    if current is not None:
+        current.attrs[key] = current.attrs.get(key, 0) + amount
+
+
+def _save_profile(profiler: cProfile.Profile, job: str) -> Optional[str]:
+    """Dump a profile and keep only the newest TRACE_PROFILE_KEEP files"""
+    try:
+        TRACE_PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        safe_job = "".join(c if c.isalnum() or c in "-_" else "_" for c in job)
+        path = TRACE_PROFILE_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_job}.prof"
+        profiler.dump_stats(str(path))
+        old = sorted(TRACE_PROFILE_DIR.glob("*.prof"), key=lambda p: p.stat().st_mtime)[:-TRACE_PROFILE_KEEP]
+        for stale in old:
+            stale.unlink(missing_ok=True)
+        return str(path)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el perfil de {job}: {e}")
+        return None
+
+
+@contextmanager
+def job_trace(job: str, **attrs) -> Iterator[Trace]:
+    """
+    Trace one job and log its timeline as a JSON line when it ends.
+    A TRACE_PROFILE_SAMPLE_RATE share of jobs also runs under cProfile; the profile covers the
+    event-loop thread (so it includes whatever else the loop ran meanwhile) and is only written
+    to TRACE_PROFILE_DIR if the job took TRACE_SLOW_JOB_SECONDS or more.
+    """
+    trace = Trace(job, **attrs)
+    if not TRACE_ENABLED:
+        yield trace
+        return
+
+    profiler = None
+    if TRACE_PROFILE_SAMPLE_RATE > 0 and random.random() < TRACE_PROFILE_SAMPLE_RATE and _profiling.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is active
+            _profiling.release()
+            profiler = None
+
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current_trace.reset(token)
+        if profiler is not None:
+            profiler.disable()
+            _profiling.release()
+            if trace.elapsed() >= TRACE_SLOW_JOB_SECONDS:
+                trace.attrs["profile"] = _save_profile(profiler, job)
+        logger.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
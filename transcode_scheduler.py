@@ -0,0 +1,187 @@
+# Transcode Scheduler
+# Caps how many ffmpeg/BMF transcodes run at once and keeps a bounded FIFO
+# queue for the rest, so bursts don't thrash the CPU.
+
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional
+
+from config import TRANSCODE_WORKERS, TRANSCODE_MAX_QUEUE
+
+
+class QueueFullError(Exception):
+    """Raised when the transcode queue cannot accept another job"""
+
+    def __init__(self):
+        super().__init__("El bot está saturado en este momento. Intenta de nuevo en unos minutos.")
+
+
+class _Waiter(ABC):
+    """A queued job. release() hands the slot over to it and calls wake()."""
+
+    def __init__(self, progress_callback: Optional[Callable[[str], None]]):
+        self.progress_callback = progress_callback
+        self.position = 0
+        self.granted = False
+
+    @abstractmethod
+    def wake(self) -> None:
+        """Signal the waiting job that it now holds the slot (called with the scheduler lock held)"""
+
+
+class _AsyncWaiter(_Waiter):
+    def __init__(self, progress_callback):
+        super().__init__(progress_callback)
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def wake(self) -> None:
+        self.loop.call_soon_threadsafe(self.event.set)
+
+
+class TranscodeScheduler:
+    """
+    Thread- and asyncio-safe admission control for transcodes.
+    At most max_workers transcodes run at once; up to max_queue more wait in FIFO order.
+    Async callers wait without holding a thread, so threads are only used by running ffmpeg processes.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting: List[_Waiter] = []
+        self.completed = 0
+        self.rejected = 0
+
+    def queue_depth(self) -> int:
+        """Jobs waiting for a transcode slot"""
+        with self._lock:
+            return len(self._waiting)
+
+    def active(self) -> int:
+        """Transcodes currently running"""
+        with self._lock:
+            return self._active
+
+    def is_full(self) -> bool:
+        """True if a new job would be rejected right now"""
+        with self._lock:
+            return self._active >= self.max_workers and len(self._waiting) >= self.max_queue
+
+    def _try_enter(self, make_waiter: Callable[[], _Waiter]) -> Optional[_Waiter]:
+        """Take a free slot (returns None) or enqueue a waiter. Must hold the lock."""
+        if self._active < self.max_workers and not self._waiting:
+            self._active += 1
+            return None
+        if len(self._waiting) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError()
+        waiter = make_waiter()
+        self._waiting.append(waiter)
+        self._report_positions()
+        return waiter
+
+    def _report_positions(self) -> None:
+        """Tell every waiter whose place in line changed. Must hold the lock."""
+        for index, waiter in enumerate(self._waiting):
+            if waiter.position != index + 1:
+                waiter.position = index + 1
+                if waiter.progress_callback:
+                    waiter.progress_callback(f"⏳ Estás en la posición #{waiter.position} de la cola de procesamiento...")
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Undo a wait that was interrupted, giving back the slot if it was already handed over"""
+        with self._lock:
+            if waiter in self._waiting:
+                self._waiting.remove(waiter)
+                self._report_positions()
+                return
+        if waiter.granted:
+            self.release()
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now and nobody is queued"""
+        with self._lock:
+            if self._active < self.max_workers and not self._waiting:
+                self._active += 1
+                return True
+            return False
+
+    async def acquire_async(self, progress_callback: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Wait on the event loop (without holding a thread) until a transcode slot is free.
+        Reports the queue position through progress_callback while waiting.
+        Raises QueueFullError immediately if the queue is full.
+        """
+        with self._lock:
+            waiter = self._try_enter(lambda: _AsyncWaiter(progress_callback))
+        if waiter is None:
+            return
+        try:
+            await waiter.event.wait()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    def reserve_extra(self, count: int) -> int:
+        """
+        Take up to count more slots that are free right now, for the helper processes of a job
+        that already holds one (segment-parallel encodes). Never takes slots queued jobs wait for.
+        Returns how many were taken; give them back with release_extra().
+        """
+        with self._lock:
+            if self._waiting:
+                return 0
+            taken = max(0, min(count, self.max_workers - self._active))
+            self._active += taken
+            return taken
+
+    def release_extra(self, count: int) -> None:
+        """Give back slots taken with reserve_extra()"""
+        with self._lock:
+            for _ in range(count):
+                self._release_one()
+
+    def release(self) -> None:
+        """Free a slot, handing it directly to the first queued job if any"""
+        with self._lock:
+            self.completed += 1
+            self._release_one()
+
+    def _release_one(self) -> None:
+        """Hand a slot to the first queued job, or mark it free. Must hold the lock."""
+        if self._waiting:
+            waiter = self._waiting.pop(0)
+            waiter.granted = True
+            waiter.wake()
+            self._report_positions()  # Everyone else moves up one position
+        else:
+            self._active -= 1
+
+    @asynccontextmanager
+    async def slot_async(self, progress_callback: Optional[Callable[[str], None]] = None) -> AsyncIterator[None]:
+        """Hold a transcode slot for the duration of the block"""
+        await self.acquire_async(progress_callback)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        """Current load and counters"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "queue_depth": len(self._waiting),
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+transcode_scheduler = TranscodeScheduler(TRANSCODE_WORKERS, TRANSCODE_MAX_QUEUE)
@@ -0,0 +1,215 @@
+# Web Server Module
+# Minimal asyncio HTTP/1.1 server that runs on the bot's own event loop and
+# serves the Telegram webhook and the health page from the same port.
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from config import WEB_KEEPALIVE_TIMEOUT, WEB_REQUEST_TIMEOUT, WEB_MAX_BODY
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_MAX_HEADERS = 100
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: str
+    headers: Dict[str, str]  # Lower-case names
+    body: bytes = b""
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class WebServer:
+    """
+    Routes are exact (method, path) matches; HEAD is answered by the GET handler without a body.
+    Connections are kept alive between requests, which suits Telegram's webhook deliveries.
+    """
+
+    def __init__(self, host: str, port: int, max_body: int = WEB_MAX_BODY):
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self._routes: Dict[Tuple[str, str], Handler] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.requests = 0
+
+    def route(self, method: str, path: str, handler: Handler) -> None:
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        logger.info(f"Web server listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+        }
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        """
+        Parse one request, None when the client closed the connection.
+        An idle connection may wait WEB_KEEPALIVE_TIMEOUT for its next request line; headers
+        and body must then arrive within WEB_REQUEST_TIMEOUT, so slow clients can't pin a connection.
+        """
+        line = await asyncio.wait_for(reader.readline(), WEB_KEEPALIVE_TIMEOUT)
+        if not line:
+            return None
+        return await asyncio.wait_for(self._read_rest(reader, line), WEB_REQUEST_TIMEOUT)
+
+    async def _read_rest(self, reader: asyncio.StreamReader, line: bytes) -> Request:
+        """Headers and body of a request whose request line was already read"""
+        method, target, _version = line.decode("latin-1").split()
+
+        headers: Dict[str, str] = {}
+        for _ in range(_MAX_HEADERS):
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body:
+            raise ValueError("body too large")
+        body = await reader.readexactly(length) if length else b""
+        parts = urlsplit(target)
+        return Request(method=method.upper(), path=parts.path, query=parts.query, headers=headers, body=body)
+
+    async def _dispatch(self, request: Request) -> Response:
+        method = "GET" if request.method == "HEAD" else request.method
+        handler = self._routes.get((method, request.path))
+        if handler is None:
+            known_path = any(path == request.path for _, path in self._routes)
+            status = HTTPStatus.METHOD_NOT_ALLOWED if known_path else HTTPStatus.NOT_FOUND
+            return Response(status=status, body=status.phrase.encode())
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error(f"Error handling {request.method} {request.path}: {e}")
+            return Response(status=500, body=b"Internal Server Error")
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ValueError:
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+                if request is None:
+                    break
+                self.requests += 1
+                response = await self._dispatch(request)
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+
+                body = b"" if request.method == "HEAD" else response.body
+                head = [
+                    f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}",
+                    f"Content-Type: {response.content_type}",
+                    f"Content-Length: {len(response.body)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ]
+                head.extend(f"{name}: {value}" for name, value in response.headers.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+HEALTH_PAGE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>RS TikTok Downloader</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            display: flex;
+            justify-content: center;
+            align-items: center;
+            height: 100vh;
+            margin: 0;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+        }
+        .container {
+            text-align: center;
+            padding: 40px;
+            background: rgba(255,255,255,0.1);
+            border-radius: 20px;
+            backdrop-filter: blur(10px);
+        }
+        h1 { font-size: 2.5em; margin-bottom: 10px; }
+        p { font-size: 1.2em; opacity: 0.9; }
+        .status {
+            display: inline-block;
+            padding: 8px 20px;
+            background: #00c853;
+            border-radius: 20px;
+            margin-top: 20px;
+        }
+        a { color: white; text-decoration: none; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>🎬 RS TikTok Downloader</h1>
+        <p>Bot de Telegram para descargar videos de TikTok</p>
+        <div class="status">✓ Bot Activo</div>
+        <p style="margin-top: 30px;">
+            <a href="https://t.me/tiktokrs_bot" target="_blank">
+                Abrir en Telegram →
+            </a>
+        </p>
+    </div>
+</body>
+</html>
+"""
+
+
+async def health_page(request: Request) -> Response:
+    """Status page for HuggingFace Spaces and uptime checks"""
+    return Response(body=HEALTH_PAGE.encode(), content_type="text/html; charset=utf-8")
+
+
+async def health_check(request: Request) -> Response:
+    return Response(body=b"ok")
+
+
+async def metrics_page(request: Request) -> Response:
+    """Prometheus scrape target"""
+    return Response(body=metrics.render().encode(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def add_health_routes(server: WebServer) -> None:
+    server.route("GET", "/", health_page)
+    server.route("GET", "/healthz", health_check)
+    server.route("GET", "/metrics", metrics_page)
@@ -0,0 +1,61 @@
+# Job Workspace Module
+# Gives every download job its own directory inside DOWNLOAD_DIR so that
+# concurrent jobs never delete each other's files.
+
+import asyncio
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from config import DOWNLOAD_DIR, DEBUG_MODE, WORKSPACE_MAX_AGE, WORKSPACE_JANITOR_INTERVAL
+
+WORKSPACE_PREFIX = "job_"
+
+
+def create_workspace() -> Path:
+    """Create a new, unique job directory and return its path"""
+    job_dir = DOWNLOAD_DIR / f"{WORKSPACE_PREFIX}{uuid.uuid4().hex}"
+    job_dir.mkdir(parents=True, exist_ok=False)
+    return job_dir
+
+
+def remove_workspace(job_dir: Optional[Path]) -> None:
+    """Delete a job directory. Only the job that created it should call this."""
+    if job_dir is None or DEBUG_MODE:
+        return
+    shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def clean_orphan_workspaces(max_age: float = WORKSPACE_MAX_AGE) -> int:
+    """
+    Remove job directories older than max_age seconds.
+    Catches workspaces left behind by crashed or killed jobs.
+    Returns the number of directories removed.
+    """
+    if DEBUG_MODE:
+        return 0
+
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in DOWNLOAD_DIR.glob(f"{WORKSPACE_PREFIX}*"):
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+        except FileNotFoundError:
+            pass  # Removed by its owner in the meantime
+    if removed:
+        print(f"Janitor: eliminados {removed} espacios de trabajo huérfanos")
+    return removed
+
+
+async def run_janitor(interval: float = WORKSPACE_JANITOR_INTERVAL) -> None:
+    """Background task: clean orphaned workspaces every interval seconds, off the event loop"""
+    while True:
+        try:
+            await asyncio.to_thread(clean_orphan_workspaces)
+        except OSError as e:
+            print(f"Janitor: error limpiando espacios de trabajo: {e}")
+        await asyncio.sleep(interval)